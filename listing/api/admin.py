@@ -8,6 +8,11 @@ from django.urls import path
 from django.utils.html import format_html
 from django.urls import reverse
 from django.http import HttpResponseRedirect
+import subprocess
+import sys
+from django.conf import settings
+from django.template.response import TemplateResponse
+from .cache_stats import get_stats, reset_stats
 from django.shortcuts import get_object_or_404
 from django.utils.html import format_html
 from django.urls import reverse
@@ -217,6 +222,20 @@ class ListingAdmin(admin.ModelAdmin):
         return "No Image"
     thumbnail_preview.short_description = 'Thumbnail'    
     
+@admin.register(SavedSearch)
+class SavedSearchAdmin(admin.ModelAdmin):
+    list_display = ('name', 'user', 'category', 'city', 'is_active', 'created_at')
+    list_filter = ('is_active', 'created_at')
+    search_fields = ('name', 'user__username', 'user__email')
+    readonly_fields = ('category', 'city', 'created_at')  # Derivate din parametri
+
+@admin.register(SavedSearchMatch)
+class SavedSearchMatchAdmin(admin.ModelAdmin):
+    list_display = ('saved_search', 'listing', 'created_at', 'notified_at')
+    list_filter = ('notified_at', 'created_at')
+    search_fields = ('saved_search__name', 'listing__title')
+    raw_id_fields = ('saved_search', 'listing')
+
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ('user', 'listing', 'amount_without_vat', 'vat_amount', 'amount_with_vat', 'currency', 'vat_rate', 'promoted_days', 'external_payment_id', 'status', 'created_at')
@@ -365,6 +384,8 @@ class ManagementCommandAdmin(admin.ModelAdmin):
         urls = super().get_urls()
         custom_urls = [
             path('clear-cache/', self.admin_site.admin_view(self.clear_cache), name='clear-cache'),
+            path('warm-cache/', self.admin_site.admin_view(self.warm_cache), name='warm-cache'),
+            path('cache-stats/', self.admin_site.admin_view(self.cache_stats), name='cache-stats'),
             path('delete-old-pending-payments/', self.admin_site.admin_view(self.delete_old_pending_payments), name='delete-old-pending-payments'),
         ]
         return custom_urls + urls
@@ -372,6 +393,10 @@ class ManagementCommandAdmin(admin.ModelAdmin):
     def run_command(self, obj):
         if obj.name == 'clear_cache':
             return format_html('<a class="button" href="{}">Clear Cache</a>', reverse('admin:clear-cache'))
+        if obj.name == 'warm_cache':
+            return format_html('<a class="button" href="{}">Warm Cache</a>', reverse('admin:warm-cache'))
+        if obj.name == 'cache_stats':
+            return format_html('<a class="button" href="{}">Cache Stats</a>', reverse('admin:cache-stats'))
         if obj.name == 'delete_old_pending_payments':
              return format_html('<a class="button" href="{}">Delete old pending payments</a>', reverse('admin:delete-old-pending-payments'))
         else:
@@ -381,7 +406,30 @@ class ManagementCommandAdmin(admin.ModelAdmin):
         call_command('clear_cache')
         self.message_user(request, "Cache cleared successfully.")
         return HttpResponseRedirect(reverse('admin:api_managementcommand_changelist'))
+
+    def warm_cache(self, request):
+        # Până la --limit request-uri nu au loc în request-ul din admin (timeout-ul worker-ului),
+        # comanda rulează într-un proces separat, care continuă și după răspuns
+        subprocess.Popen(
+            [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'warm_cache'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+        )
+        self.message_user(request, "Preîncălzirea cache-ului a pornit în fundal.")
+        return HttpResponseRedirect(reverse('admin:api_managementcommand_changelist'))
     
+    def cache_stats(self, request):
+        if request.method == 'POST':
+            reset_stats()
+            self.message_user(request, "Statisticile cache-ului au fost resetate.")
+            return HttpResponseRedirect(reverse('admin:cache-stats'))
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Cache Stats',
+            'opts': self.model._meta,
+            'stats': get_stats(),
+        }
+        return TemplateResponse(request, 'admin/cache_stats.html', context)
+
     def delete_old_pending_payments(self, request):
         call_command('delete_old_pending_payments')
         self.message_user(request, "Plățile 'pending' mai vechi de 24h au fost șterse.")
@@ -0,0 +1,410 @@
+"""
+Backend-uri de cache pentru proiect.
+
+TwoTierCache: un LRU în memoria procesului în fața unui cache partajat (alt alias din
+settings.CACHES). Scrierile merg întotdeauna în cache-ul partajat; invalidarea între procese
+se face prin ștampile de versiune (un contor de generație și un jurnal al cheilor modificate).
+Nivelul partajat este la fel de partajat ca backend-ul ales: cu FileBasedCache (configurația
+actuală) sau SQLiteCache doar între procesele aceleiași mașini; între mai multe mașini este
+nevoie de Redis/Memcached ca alias 'shared'.
+
+SQLiteCache: cache partajat între procesele de pe aceeași mașină, într-un fișier SQLite.
+Folosit ca nivel partajat în teste (și oriunde nu există Redis/Memcached).
+"""
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+class LocalTier:
+    """Starea nivelului local: LRU-ul și ultima generație văzută din cache-ul partajat."""
+
+    def __init__(self):
+        self.entries = OrderedDict()  # cheie -> (expiră_la, valoare serializată)
+        self.lock = threading.RLock()
+        self.seen_generation = None
+        self.next_sync = 0.0
+
+
+_local_tiers = {}
+_local_tiers_lock = threading.Lock()
+
+
+class TwoTierCache(BaseCache):
+    """
+    OPTIONS:
+        SHARED_ALIAS: aliasul cache-ului partajat (implicit 'shared')
+        LOCAL_MAX_ENTRIES: numărul maxim de chei în LRU-ul local (implicit 1000)
+        LOCAL_TIMEOUT: cât poate trăi o cheie în LRU-ul local, în secunde (implicit 30)
+        SYNC_INTERVAL: cât de des citim generația din cache-ul partajat, în secunde (implicit 1)
+        BYPASS_PREFIXES: chei care nu sunt ținute local (ex. contoarele DRF throttle, chei rescrise des)
+        IMMUTABLE_PREFIXES: chei ținute local fără a fi publicate în jurnal, pentru că valoarea unei
+            chei nu se schimbă niciodată (versiunea face parte din cheie, ex. fragmentele de card)
+        LOG_SIZE: câte generații păstrează jurnalul de invalidare (implicit 1000)
+    """
+    generation_key = '__two_tier_generation__'
+    log_key_prefix = '__two_tier_log__'
+    log_timeout = 24 * 60 * 60
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = options.get('SHARED_ALIAS', 'shared')
+        self.local_max_entries = int(options.get('LOCAL_MAX_ENTRIES', 1000))
+        self.local_timeout = float(options.get('LOCAL_TIMEOUT', 30))
+        self.sync_interval = float(options.get('SYNC_INTERVAL', 1))
+        self.bypass_prefixes = tuple(options.get('BYPASS_PREFIXES', ('throttle_',)))
+        self.immutable_prefixes = tuple(options.get('IMMUTABLE_PREFIXES', ()))
+        self.log_size = int(options.get('LOG_SIZE', 1000))
+
+        # Django creează câte o instanță de backend per thread; nivelul local este comun tuturor
+        # thread-urilor din proces, pentru aceeași configurație
+        tier_key = (str(location), self.shared_alias, self.key_prefix, self.version)
+        with _local_tiers_lock:
+            self._tier = _local_tiers.setdefault(tier_key, LocalTier())
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    # Nivelul local (LRU)
+
+    def _is_local(self, key):
+        return not key.startswith(self.bypass_prefixes)
+
+    def _is_published(self, key):
+        return self._is_local(key) and not key.startswith(self.immutable_prefixes)
+
+    def _local_get(self, local_key):
+        with self._tier.lock:
+            entry = self._tier.entries.get(local_key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if expires_at <= time.monotonic():
+                del self._tier.entries[local_key]
+                return None
+            self._tier.entries.move_to_end(local_key)
+        return payload
+
+    def _local_set(self, local_key, value, timeout):
+        local_timeout = self.local_timeout if timeout is None else min(timeout, self.local_timeout)
+        if local_timeout <= 0:
+            return
+        # Valorile sunt ținute serializate, ca apelantul să nu poată modifica obiectul din cache
+        payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._tier.lock:
+            self._tier.entries[local_key] = (time.monotonic() + local_timeout, payload)
+            self._tier.entries.move_to_end(local_key)
+            while len(self._tier.entries) > self.local_max_entries:
+                self._tier.entries.popitem(last=False)
+
+    def _local_discard(self, local_keys):
+        with self._tier.lock:
+            for local_key in local_keys:
+                self._tier.entries.pop(local_key, None)
+
+    def clear_local(self):
+        with self._tier.lock:
+            self._tier.entries.clear()
+
+    # Invalidare între procese
+
+    def _sync(self, force=False):
+        """
+        Citește generația curentă și elimină local cheile modificate de alte procese între timp.
+        Dacă jurnalul nu mai acoperă toate generațiile, golim tot nivelul local.
+        """
+        now = time.monotonic()
+        if not force and now < self._tier.next_sync:
+            return
+        self._tier.next_sync = now + self.sync_interval
+
+        generation = self.shared.get(self.generation_key, 0)
+        seen = self._tier.seen_generation
+        self._tier.seen_generation = generation
+        if seen is None:
+            self.clear_local()  # Prima sincronizare: nu știm ce s-a modificat înainte
+            return
+        if generation == seen:
+            return
+        if generation < seen or generation - seen > self.log_size:
+            # Cache-ul partajat a fost golit sau am rămas prea mult în urmă
+            self.clear_local()
+            return
+
+        log_keys = [f'{self.log_key_prefix}:{number}' for number in range(seen + 1, generation + 1)]
+        entries = self.shared.get_many(log_keys)
+        if len(entries) < len(log_keys):
+            self.clear_local()  # Intrări lipsă (expirate sau pierdute): nu știm ce s-a schimbat
+            return
+        for changed_keys in entries.values():
+            if changed_keys is None:
+                self.clear_local()
+                return
+            self._local_discard(changed_keys)
+
+    def _publish(self, local_keys):
+        """Înregistrează cheile modificate sub o generație nouă, pentru celelalte procese."""
+        local_keys = [local_key for local_key in local_keys if local_key is not None]
+        if not local_keys:
+            return
+        for attempt in range(5):
+            try:
+                generation = self.shared.incr(self.generation_key)
+            except ValueError:
+                self.shared.add(self.generation_key, 0, None)
+                generation = self.shared.incr(self.generation_key)
+            # incr din FileBasedCache nu este atomic: două procese pot primi aceeași generație.
+            # add() nu suprascrie intrarea celuilalt; cel care pierde trece la generația următoare.
+            if self.shared.add(f'{self.log_key_prefix}:{generation}', local_keys, self.log_timeout):
+                break
+        else:
+            # Nu am obținut o generație proprie: forțăm ceilalți să-și golească nivelul local
+            self.shared.set(f'{self.log_key_prefix}:{generation}', None, self.log_timeout)
+        # Propriile modificări nu trebuie reaplicate la următoarea sincronizare
+        if self._tier.seen_generation is not None and generation == self._tier.seen_generation + 1:
+            self._tier.seen_generation = generation
+
+    def _local_key(self, key, version):
+        return self.make_and_validate_key(key, version=version)
+
+    def _timeout_seconds(self, timeout):
+        # Timeout relativ (secunde), transmis explicit nivelului partajat
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    # API-ul BaseCache
+
+    def get(self, key, default=None, version=None):
+        local_key = self._local_key(key, version)
+        if self._is_local(key):
+            self._sync()
+            payload = self._local_get(local_key)
+            if payload is not None:
+                return pickle.loads(payload)
+
+        sentinel = object()
+        value = self.shared.get(key, sentinel, version=self._shared_version(version))
+        if value is sentinel:
+            return default
+        if self._is_local(key):
+            self._local_set(local_key, value, self.local_timeout)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = {}
+        remote = []
+        if any(self._is_local(key) for key in keys):
+            self._sync()
+        for key in keys:
+            payload = self._local_get(self._local_key(key, version)) if self._is_local(key) else None
+            if payload is not None:
+                found[key] = pickle.loads(payload)
+            else:
+                remote.append(key)
+
+        if remote:
+            values = self.shared.get_many(remote, version=self._shared_version(version))
+            for key, value in values.items():
+                if self._is_local(key):
+                    self._local_set(self._local_key(key, version), value, self.local_timeout)
+            found.update(values)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self._local_key(key, version)
+        timeout = self._timeout_seconds(timeout)
+        self.shared.set(key, value, timeout, version=self._shared_version(version))
+        if self._is_local(key):
+            if self._is_published(key):
+                self._publish([local_key])
+            self._local_set(local_key, value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout_seconds(timeout)
+        failed = self.shared.set_many(data, timeout, version=self._shared_version(version))
+        stored = {key: value for key, value in data.items() if key not in failed and self._is_local(key)}
+        # O singură generație pentru tot lotul
+        self._publish([self._local_key(key, version) for key in stored if self._is_published(key)])
+        for key, value in stored.items():
+            self._local_set(self._local_key(key, version), value, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self._local_key(key, version)
+        timeout = self._timeout_seconds(timeout)
+        added = self.shared.add(key, value, timeout, version=self._shared_version(version))
+        if added and self._is_local(key):
+            if self._is_published(key):
+                self._publish([local_key])
+            self._local_set(local_key, value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, self._timeout_seconds(timeout), version=self._shared_version(version))
+
+    def delete(self, key, version=None):
+        local_key = self._local_key(key, version)
+        deleted = self.shared.delete(key, version=self._shared_version(version))
+        if self._is_local(key):
+            self._local_discard([local_key])
+            self._publish([local_key])
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.shared.delete_many(keys, version=self._shared_version(version))
+        local_keys = [self._local_key(key, version) for key in keys if self._is_local(key)]
+        self._local_discard(local_keys)
+        self._publish(local_keys)  # O singură generație pentru tot lotul
+
+    def has_key(self, key, version=None):
+        if self._is_local(key):
+            self._sync()
+            if self._local_get(self._local_key(key, version)) is not None:
+                return True
+        return self.shared.has_key(key, version=self._shared_version(version))
+
+    def incr(self, key, delta=1, version=None):
+        # Contoarele sunt atomice doar în nivelul partajat; copia locală este invalidată
+        value = self.shared.incr(key, delta, version=self._shared_version(version))
+        if self._is_local(key):
+            local_key = self._local_key(key, version)
+            self._local_discard([local_key])
+            self._publish([local_key])
+        return value
+
+    def clear(self):
+        self.shared.clear()
+        self.clear_local()
+        # Generația este ștearsă odată cu restul cheilor: celelalte procese își golesc nivelul local
+        self._tier.seen_generation = None
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+    def _shared_version(self, version):
+        # Versiunea implicită a acestui alias este transmisă explicit nivelului partajat
+        return self.version if version is None else version
+
+
+class SQLiteCache(BaseCache):
+    """
+    Cache într-un fișier SQLite (LOCATION), partajat de toate procesele de pe mașină.
+    incr() este atomic, spre deosebire de FileBasedCache.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.location = str(location)
+        self._connections = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._connections, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.location, timeout=30, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache_entries '
+                '(cache_key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+            )
+            self._connections.connection = connection
+        return connection
+
+    def _expires(self, timeout):
+        # Momentul expirării (timestamp) sau None pentru chei fără expirare
+        return self.get_backend_timeout(timeout)
+
+    def _row(self, connection, key):
+        row = connection.execute(
+            'SELECT value, expires FROM cache_entries WHERE cache_key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] is not None and row[1] <= time.time():
+            connection.execute('DELETE FROM cache_entries WHERE cache_key = ?', (key,))
+            return None
+        return row
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._row(self._connection(), key)
+        return default if row is None else pickle.loads(row[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._connection().execute(
+            'INSERT OR REPLACE INTO cache_entries (cache_key, value, expires) VALUES (?, ?, ?)',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._expires(timeout)),
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            if self._row(connection, key) is not None:
+                return False
+            connection.execute(
+                'INSERT INTO cache_entries (cache_key, value, expires) VALUES (?, ?, ?)',
+                (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._expires(timeout)),
+            )
+            return True
+        finally:
+            connection.execute('COMMIT')
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        connection = self._connection()
+        if self._row(connection, key) is None:
+            return False
+        connection.execute(
+            'UPDATE cache_entries SET expires = ? WHERE cache_key = ?', (self._expires(timeout), key)
+        )
+        return True
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute('DELETE FROM cache_entries WHERE cache_key = ?', (key,))
+        return cursor.rowcount > 0
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._row(self._connection(), key) is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')  # Citire și scriere în aceeași tranzacție: atomic între procese
+        try:
+            row = self._row(connection, key)
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache_entries SET value = ? WHERE cache_key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key),
+            )
+            return value
+        finally:
+            connection.execute('COMMIT')
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache_entries')
+
+    def delete_expired(self):
+        """Șterge intrările expirate; returnează numărul lor."""
+        cursor = self._connection().execute(
+            'DELETE FROM cache_entries WHERE expires IS NOT NULL AND expires <= ?', (time.time(),)
+        )
+        return cursor.rowcount
+
+    def close(self, **kwargs):
+        # Conexiunea per thread rămâne deschisă între request-uri, ca la FileBasedCache (fără cost de reconectare)
+        pass
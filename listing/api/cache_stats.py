@@ -0,0 +1,155 @@
+"""
+Statistici pentru cache, pe grupuri (prefix de cheie sau view): hit-uri, miss-uri, valori vechi servite,
+timpul de citire și de calcul, dimensiunea valorilor și numărul de invalidări.
+
+Contoarele sunt adunate în memoria procesului și trimise în cache-ul partajat (incr) cel mult o dată
+la STATS_FLUSH_INTERVAL secunde, ca instrumentarea să nu adauge o scriere la fiecare request.
+
+Grupurile sunt înregistrate fără citire-modificare-scriere: cache.add pe o cheie per grup alege un
+singur proces, care primește un slot (incr) și scrie numele grupului în el; lista este citită din sloturi.
+"""
+import pickle
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+
+STATS_PREFIX = 'cache_stats'
+STATS_SLOTS_KEY = f'{STATS_PREFIX}:slots'
+STATS_FLUSH_INTERVAL = 10
+# Dimensiunea valorilor (pickle) este măsurată la 1 din N calculări și înmulțită cu N
+VALUE_SIZE_SAMPLE_RATE = 10
+
+# Timpii sunt în microsecunde, ca să poată fi adunați cu incr
+METRICS = ('hits', 'misses', 'stale', 'hit_us', 'fill_us', 'bytes', 'invalidations')
+
+_pending = defaultdict(Counter)
+_lock = threading.Lock()
+_next_flush = 0.0
+
+
+def stats_group(key):
+    """Grupul unei chei: view-ul pentru răspunsurile cache-uite, altfel primul segment (prefixul)."""
+    parts = key.split(':')
+    if parts[0] == 'response' and len(parts) > 1:
+        return f'{parts[0]}:{parts[1]}'
+    return parts[0]
+
+
+def group_key(group):
+    return f'{STATS_PREFIX}:group:{group}'
+
+
+def slot_key(slot):
+    return f'{STATS_PREFIX}:slot:{slot}'
+
+
+def value_size(value):
+    if isinstance(value, bytes):
+        return len(value)
+    if random.randrange(VALUE_SIZE_SAMPLE_RATE):
+        return 0
+    try:
+        return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)) * VALUE_SIZE_SAMPLE_RATE
+    except Exception:
+        return 0
+
+
+def record(group, **metrics):
+    global _next_flush
+    with _lock:
+        counter = _pending[group]
+        for name, value in metrics.items():
+            counter[name] += value
+        due = time.monotonic() >= _next_flush
+        if due:
+            _next_flush = time.monotonic() + STATS_FLUSH_INTERVAL
+    if due:
+        flush()
+
+
+def record_hit(group, started):
+    record(group, hits=1, hit_us=(time.monotonic() - started) * 1000000)
+
+
+def record_fill(group, started, value, misses=1):
+    record(group, misses=misses, fill_us=(time.monotonic() - started) * 1000000, bytes=value_size(value))
+
+
+def flush():
+    """Trimite contoarele locale în cache-ul partajat."""
+    with _lock:
+        pending = {group: counter for group, counter in _pending.items() if counter}
+        _pending.clear()
+    if not pending:
+        return
+
+    register_groups(pending)
+
+    for group, counter in pending.items():
+        for name, value in counter.items():
+            value = int(round(value))
+            if not value:
+                continue
+            key = f'{STATS_PREFIX}:{group}:{name}'
+            try:
+                cache.incr(key, value)
+            except ValueError:
+                if not cache.add(key, value, None):
+                    cache.incr(key, value)
+
+
+def register_groups(groups):
+    registered = cache.get_many([group_key(group) for group in groups])
+    for group in groups:
+        if group_key(group) in registered or not cache.add(group_key(group), True, None):
+            continue
+        cache.add(STATS_SLOTS_KEY, 0, None)
+        cache.set(slot_key(cache.incr(STATS_SLOTS_KEY)), group, None)
+
+
+def registered_groups():
+    slots = cache.get(STATS_SLOTS_KEY, 0)
+    stored = cache.get_many([slot_key(slot) for slot in range(1, slots + 1)])
+    return sorted(set(stored.values()))
+
+
+def get_stats():
+    """Contoarele adunate din toate procesele, cu medii și rata de hit, per grup."""
+    flush()
+    groups = registered_groups()
+    keys = [f'{STATS_PREFIX}:{group}:{name}' for group in groups for name in METRICS]
+    stored = cache.get_many(keys)
+
+    stats = []
+    for group in groups:
+        row = {name: stored.get(f'{STATS_PREFIX}:{group}:{name}', 0) for name in METRICS}
+        lookups = row['hits'] + row['stale'] + row['misses']
+        stats.append({
+            'group': group,
+            'hits': row['hits'],
+            'misses': row['misses'],
+            'stale': row['stale'],
+            'invalidations': row['invalidations'],
+            'hit_ratio': round((row['hits'] + row['stale']) / lookups, 4) if lookups else None,
+            'avg_hit_ms': round(row['hit_us'] / row['hits'] / 1000, 3) if row['hits'] else None,
+            'avg_fill_ms': round(row['fill_us'] / row['misses'] / 1000, 3) if row['misses'] else None,
+            'avg_bytes': round(row['bytes'] / row['misses']) if row['misses'] else None,
+            'fill_seconds_total': round(row['fill_us'] / 1000000, 3),
+        })
+    return sorted(stats, key=lambda row: -(row['hits'] + row['stale'] + row['misses'] + row['invalidations']))
+
+
+def reset_stats():
+    with _lock:
+        _pending.clear()
+    slots = cache.get(STATS_SLOTS_KEY, 0)
+    groups = registered_groups()
+    cache.delete_many(
+        [f'{STATS_PREFIX}:{group}:{name}' for group in groups for name in METRICS]
+        + [group_key(group) for group in groups]
+        + [slot_key(slot) for slot in range(1, slots + 1)]
+    )
+    cache.delete(STATS_SLOTS_KEY)
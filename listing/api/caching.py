@@ -0,0 +1,334 @@
+"""
+Cache pentru răspunsuri, invalidat pe tag-uri și protejat împotriva stampede-ului.
+
+Fiecare intrare reține versiunile tag-urilor de care depinde (anunț, categorie, localitate,
+județ, cartier). Invalidarea unui tag îi schimbă versiunea, iar intrările care au fost
+construite cu versiunea veche devin învechite la următoarea citire. Nu se șterge nimic
+explicit: intrările vechi expiră singure.
+
+O intrare învechită (tag invalidat sau TTL logic depășit) este recalculată de un singur
+worker (lock în cache), iar ceilalți primesc între timp valoarea veche. Înainte de expirare,
+intrările sunt reîmprospătate probabilistic (XFetch), proporțional cu durata calculului.
+
+Validatoarele HTTP (ETag/Last-Modified) pentru GET-uri condiționate sunt construite din
+Listing.updated_date și din ștampilele TableVersion ale nomenclatoarelor.
+"""
+import hashlib
+import math
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from .cache_stats import record, record_fill, record_hit, stats_group
+from .models import TableVersion
+
+TAG_VERSION_PREFIX = 'cache_tag'
+RESPONSE_CACHE_PREFIX = 'response'
+LOCK_PREFIX = 'cache_lock'
+TABLE_VERSION_PREFIX = 'table_version'
+# O citire concurentă cu o modificare poate repune în cache ștampila veche; expiră singură
+TABLE_VERSION_TIMEOUT = 5 * 60
+
+# Cât timp după TTL-ul logic mai poate fi servită o valoare veche, cât se recalculează
+STALE_GRACE = 10 * 60
+# Durata maximă a unui lock de recalculare (dacă worker-ul moare, lock-ul expiră singur)
+LOCK_TIMEOUT = 30
+# Cât așteaptă un request fără valoare veche după worker-ul care recalculează
+LOCK_WAIT = 5
+LOCK_POLL_INTERVAL = 0.05
+# XFetch: valori mai mari reîmprospătează mai devreme
+XFETCH_BETA = 1.0
+
+# Tag-ul listelor care nu sunt restrânse la o categorie sau o zonă
+ALL_LISTINGS_TAG = 'listings'
+
+# Parametrii de filtrare care restrâng un răspuns la un singur grup de anunțuri
+SCOPE_TAG_PARAMS = ('neighborhood', 'city', 'county', 'category')
+
+
+def tag_version_key(tag):
+    return f'{TAG_VERSION_PREFIX}:{tag}'
+
+
+def new_tag_version():
+    # Versiune bazată pe timp: dacă cheia tag-ului dispare din cache, versiunea nouă nu poate
+    # coincide cu cea reținută de intrările vechi
+    return time.time_ns() // 1000
+
+
+def get_tag_versions(tags):
+    """Versiunile curente pentru tag-uri; tag-urile fără versiune primesc una nouă."""
+    tags = sorted(set(tags))
+    stored = cache.get_many([tag_version_key(tag) for tag in tags])
+    versions = {}
+    for tag in tags:
+        key = tag_version_key(tag)
+        version = stored.get(key)
+        if version is None:
+            version = new_tag_version()
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)  # Alt proces a creat-o între timp
+        versions[tag] = version
+    return versions
+
+
+def invalidate_tags(*tags):
+    """Invalidează toate intrările care depind de oricare dintre tag-uri."""
+    tags = set(tag for tag in tags if tag)
+    for tag in tags:
+        record(f'tag:{tag.split(":")[0]}', invalidations=1)
+    # O versiune nouă (nu incr) pentru toate tag-urile: un singur set_many, deci o singură
+    # generație publicată de TwoTierCache pentru tot lotul
+    version = new_tag_version()
+    cache.set_many({tag_version_key(tag): version for tag in tags}, None)
+
+
+def should_refresh_early(expires_at, delta, beta=XFETCH_BETA):
+    """
+    XFetch: decide aleator dacă valoarea trebuie recalculată înainte de expires_at.
+    delta este durata ultimului calcul, în secunde; probabilitatea crește spre expirare.
+    """
+    return time.time() - delta * beta * math.log(1.0 - random.random()) >= expires_at
+
+
+def get_tagged(key):
+    """Valoarea din cache, sau None dacă lipsește, a expirat ori dacă vreun tag a fost invalidat între timp."""
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    versions, value, expires_at, delta = entry
+    if expires_at <= time.time() or get_tag_versions(versions) != versions:
+        return None
+    return value
+
+
+def set_tagged(key, value, versions, timeout=None, delta=0.0):
+    """
+    versions trebuie citite cu get_tag_versions() înainte de calculul valorii, ca o invalidare
+    făcută în timpul calculului să nu fie pierdută. Intrarea rămâne în cache încă STALE_GRACE
+    secunde după TTL, pentru a putea fi servită cât timp altcineva o recalculează.
+    """
+    if timeout is None:
+        timeout = settings.CACHES['default']['TIMEOUT']
+    cache.set(key, (versions, value, time.time() + timeout, delta), timeout + STALE_GRACE)
+
+
+def wait_for_value(key):
+    """Așteaptă (cel mult LOCK_WAIT secunde) ca worker-ul care deține lock-ul să scrie valoarea."""
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        value = get_tagged(key)
+        if value is not None:
+            return value
+        if not cache.has_key(f'{LOCK_PREFIX}:{key}'):
+            break  # Worker-ul a terminat fără să scrie (ex. răspuns care nu se păstrează)
+    return None
+
+
+def get_or_compute(key, compute, tags, timeout=None):
+    """
+    Valoarea din cache sau compute(), cu o singură recalculare per cheie (single-flight).
+
+    tags poate fi un set pe care compute() îl completează cu tag-uri descoperite în timpul calculului.
+    Dacă compute() întoarce None, nu se păstrează nimic.
+    """
+    group = stats_group(key)
+    started = time.monotonic()
+    entry = cache.get(key)
+    if entry is not None:
+        versions, value, expires_at, delta = entry
+        if get_tag_versions(versions) == versions and not should_refresh_early(expires_at, delta):
+            record_hit(group, started)
+            return value
+
+    # FileBasedCache.add nu este atomic între procese: rar, doi workeri pot recalcula simultan
+    lock_key = f'{LOCK_PREFIX}:{key}'
+    if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        if entry is not None:
+            record(group, stale=1)
+            return value  # Valoarea veche, cât recalculează altcineva
+        value = wait_for_value(key)
+        if value is not None:
+            record_hit(group, started)  # Timpul include așteptarea după worker-ul care a calculat
+            return value
+        # Worker-ul cu lock-ul este prea lent sau a murit: calculăm și noi, fără să mai așteptăm
+        lock_key = None
+
+    try:
+        versions = get_tag_versions(tags)
+        computing = time.monotonic()
+        value = compute()
+        delta = time.monotonic() - computing
+        if value is not None:
+            extra_tags = set(tags) - set(versions)
+            if extra_tags:
+                versions.update(get_tag_versions(extra_tags))
+            set_tagged(key, value, versions, timeout, delta)
+            record_fill(group, started, value)
+        else:
+            record(group, misses=1)
+        return value
+    finally:
+        if lock_key is not None:
+            cache.delete(lock_key)
+
+
+def listing_cache_tags(document):
+    """Tag-urile afectate de un anunț (primește Listing sau ListingSearchDocument)."""
+    listing_id = getattr(document, 'listing_id', None) or document.pk
+    tags = [f'listing:{listing_id}', ALL_LISTINGS_TAG]
+    for name in ('category', 'county', 'city', 'neighborhood'):
+        value = getattr(document, f'{name}_id')
+        if value is not None:
+            tags.append(f'{name}:{value}')
+    # Combinația cea mai des folosită (anunțuri similare, liste filtrate pe categorie și oraș)
+    tags.append(category_city_tag(document.category_id, document.city_id))
+    return tags
+
+
+def category_city_tag(category_id, city_id):
+    return f'category_city:{category_id}:{city_id}'
+
+
+def scope_tags_for_params(params):
+    """
+    Tag-ul pentru un răspuns calculat din filtrele unei liste de anunțuri: cel mai restrâns grup
+    (cartier, categorie + localitate, localitate, județ, categorie) din parametri, altfel toate anunțurile.
+    """
+    values = {}
+    for name in SCOPE_TAG_PARAMS:
+        try:
+            values[name] = int(params.get(name))
+        except (TypeError, ValueError):
+            continue
+    if 'neighborhood' not in values and 'category' in values and 'city' in values:
+        return [category_city_tag(values['category'], values['city'])]
+    for name in SCOPE_TAG_PARAMS:
+        if name in values:
+            return [f'{name}:{values[name]}']
+    return [ALL_LISTINGS_TAG]
+
+
+def response_cache_key(prefix, request):
+    query = '&'.join(sorted(f'{name}={value}' for name, values in request.GET.lists() for value in values))
+    digest = hashlib.md5(f'{request.path}?{query}'.encode('utf-8')).hexdigest()
+    return f'{RESPONSE_CACHE_PREFIX}:{prefix}:{digest}'
+
+
+def cache_response(timeout=None, tags=(), key_prefix=None):
+    """
+    Decorator pentru metodele get() din APIView; înlocuiește cache_page pentru răspunsurile
+    care trebuie invalidate țintit și recalculate de un singur worker (vezi get_or_compute).
+
+    tags: șabloane formatate cu argumentele din URL (ex. 'listing:{uuid}'). View-ul poate adăuga
+    tag-uri descoperite în timpul calculului în self.cache_tags. Doar răspunsurile 200 sunt păstrate.
+    """
+    def decorator(view_method):
+        prefix = key_prefix or view_method.__qualname__
+
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            self.cache_tags = {tag.format(**kwargs) for tag in tags}
+            computed = {}
+
+            def compute():
+                response = view_method(self, request, *args, **kwargs)
+                computed['response'] = response
+                return response.data if response.status_code == 200 else None
+
+            data = get_or_compute(response_cache_key(prefix, request), compute, self.cache_tags, timeout)
+            if 'response' in computed:
+                return computed['response']
+            return Response(data)
+
+        return wrapper
+
+    return decorator
+
+
+# GET condiționat
+
+def table_name(model):
+    return model._meta.model_name
+
+
+def bump_table_version(model):
+    """Marchează tabela ca modificată; ștampila din cache este ștearsă după commit."""
+    name = table_name(model)
+    TableVersion.bump(name)
+    transaction.on_commit(lambda: cache.delete(f'{TABLE_VERSION_PREFIX}:{name}'))
+
+
+def get_table_versions(names):
+    """{nume: (versiune, updated_at)}, din cache; o tabelă nemodificată niciodată are (0, None)."""
+    keys = {name: f'{TABLE_VERSION_PREFIX}:{name}' for name in names}
+    stored = cache.get_many(keys.values())
+    versions = {name: stored[key] for name, key in keys.items() if key in stored}
+
+    missing = [name for name in names if name not in versions]
+    if missing:
+        rows = {row.name: (row.version, row.updated_at) for row in TableVersion.objects.filter(name__in=missing)}
+        for name in missing:
+            versions[name] = rows.get(name, (0, None))
+            cache.add(keys[name], versions[name], TABLE_VERSION_TIMEOUT)
+    return versions
+
+
+def make_etag(*parts):
+    return '"%s"' % hashlib.md5(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def table_validators(*models):
+    """ETag și Last-Modified pentru un răspuns care depinde doar de conținutul tabelelor date."""
+    versions = get_table_versions([table_name(model) for model in models])
+    etag = make_etag(*(f'{name}.{version}' for name, (version, updated_at) in sorted(versions.items())))
+    modified = [updated_at for version, updated_at in versions.values() if updated_at is not None]
+    return etag, max(modified) if modified else None
+
+
+def conditional_response(request, build, etag=None, last_modified=None):
+    """
+    304 dacă validatoarele din request (If-None-Match / If-Modified-Since) se potrivesc,
+    altfel răspunsul construit de build(). Serializarea are loc doar în build().
+    """
+    started = time.monotonic()
+    resolver_match = getattr(request, 'resolver_match', None)
+    group = f'conditional:{resolver_match.url_name if resolver_match else request.path}'
+    timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = build()
+        record(group, misses=1, fill_us=(time.monotonic() - started) * 1000000)
+    elif response.status_code == 304:
+        record_hit(group, started)
+    if response.status_code in (200, 304):
+        if etag is not None:
+            response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        # Clientul poate păstra răspunsul, dar trebuie să-l revalideze la fiecare folosire
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+def conditional_on_tables(*models):
+    """Decorator pentru get(): răspuns 304 fără interogări când tabelele nu s-au modificat."""
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            etag, last_modified = table_validators(*models)
+            return conditional_response(
+                request, lambda: view_method(self, request, *args, **kwargs), etag, last_modified
+            )
+
+        return wrapper
+
+    return decorator
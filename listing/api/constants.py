@@ -66,6 +66,15 @@ NUMAR_CAMERE_CHOICES = [
     (5, '5+ camere'),
 ]  
 
+# Intervale de preț pentru fațete (limita de jos inclusă, cea de sus exclusă)
+PRICE_FACET_BUCKETS = [
+    (0, None, 50000, 'Sub 50.000'),
+    (1, 50000, 100000, '50.000 - 100.000'),
+    (2, 100000, 150000, '100.000 - 150.000'),
+    (3, 150000, 250000, '150.000 - 250.000'),
+    (4, 250000, None, 'Peste 250.000'),
+]
+
 NUMBER_OF_BATHROOMS_CHOICES = [
     (0, 'Fără baie'),
     (1, '1 baie'),
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from api.models import Listing, ListingSearchDocument
+
+class Command(BaseCommand):
+    help = "Calculează price_per_m2 pentru anunțurile existente, în loturi, cu bulk_update"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Numărul de anunțuri actualizate per lot')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        updated = 0
+        last_pk = None
+
+        # Parcurgem tabela după id (keyset), fără OFFSET și fără a încărca toate rândurile în memorie
+        while True:
+            queryset = Listing.objects.only('pk', 'price', 'suprafata_utila', 'price_per_m2').order_by('pk')
+            if last_pk is not None:
+                queryset = queryset.filter(pk__gt=last_pk)
+            batch = list(queryset[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            changed = []
+            for listing in batch:
+                value = listing.compute_price_per_m2()
+                if listing.price_per_m2 != value:
+                    listing.price_per_m2 = value
+                    changed.append(listing)
+
+            if changed:
+                # bulk_update nu declanșează signals, deci actualizăm și documentele de căutare
+                Listing.objects.bulk_update(changed, ['price_per_m2'])
+                ListingSearchDocument.objects.bulk_update(
+                    [ListingSearchDocument(listing_id=listing.pk, price_per_m2=listing.price_per_m2) for listing in changed],
+                    ['price_per_m2'],
+                )
+                updated += len(changed)
+
+        self.stdout.write(self.style.SUCCESS(f'price_per_m2 a fost actualizat pentru {updated} anunțuri.'))
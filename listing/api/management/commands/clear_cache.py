@@ -1,16 +1,16 @@
-import os
-import shutil
+from django.core.cache import cache
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
-from django.conf import settings
 
 class Command(BaseCommand):
-    help = 'Clears the cache directory'
+    help = 'Clears the whole cache; global fallback when targeted (tag-based) invalidation is not enough'
 
-    def handle(self, *args, **kwargs):
-        cache_dir = settings.CACHES['default']['LOCATION']
+    def add_arguments(self, parser):
+        parser.add_argument('--warm', action='store_true', help='Run warm_cache right after clearing')
 
-        if os.path.exists(cache_dir):
-            shutil.rmtree(cache_dir)
-            os.makedirs(cache_dir)
-        else:
-            self.stdout.write(self.style.WARNING(f'Cache directory {cache_dir} does not exist.'))
\ No newline at end of file
+    def handle(self, *args, **options):
+        # TwoTierCache golește cache-ul partajat; celelalte procese își golesc LRU-ul local la următoarea sincronizare
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS('Cache cleared.'))
+        if options['warm']:
+            call_command('warm_cache', stdout=self.stdout)
@@ -1,33 +1,171 @@
+import json
 import os
+import pickle
 import time
-from django.core.management.base import BaseCommand
+from collections import defaultdict
 from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+
+# Numele fișierelor FileBasedCache sunt hash-uri md5 (hex): primul caracter împarte directorul în 16 shard-uri
+SHARDS = '0123456789abcdef'
+CACHE_SUFFIX = '.djcache'
+STATE_FILE = 'sweep_state.json'
+
+# Intervalele pentru distribuția vârstei ultimului acces (secunde, etichetă)
+HIT_AGE_BUCKETS = [
+    (60, '< 1 min'),
+    (10 * 60, '< 10 min'),
+    (60 * 60, '< 1 h'),
+    (8 * 60 * 60, '< 8 h'),
+    (24 * 60 * 60, '< 1 zi'),
+    (None, '>= 1 zi'),
+]
 
 class Command(BaseCommand):
-    help = 'Deletes expired cache files'
-
-    def handle(self, *args, **kwargs):
-        cache_dir = settings.CACHES['default']['LOCATION']
-        timeout = settings.CACHES['default']['TIMEOUT']  # Timpul de expirare al cache-ului, în secunde
-
-        # Verificăm dacă directorul de cache există
-        if os.path.exists(cache_dir):
-            current_time = time.time()  # Obține timpul curent în secunde
-
-            # Parcurgem fișierele din directorul de cache
-            for filename in os.listdir(cache_dir):
-                file_path = os.path.join(cache_dir, filename)
-
-                # Verificăm dacă fișierul este un fișier (nu un director)
-                if os.path.isfile(file_path):
-                    file_mtime = os.path.getmtime(file_path)  # Obținem timpul ultimei modificări a fișierului
-
-                    # Calculăm diferența de timp dintre timpul curent și ultima modificare a fișierului
-                    if current_time - file_mtime > timeout:
-                        try:
-                            os.remove(file_path)  # Ștergem fișierul
-                            self.stdout.write(self.style.SUCCESS(f'Successfully deleted expired cache file: {filename}'))
-                        except Exception as e:
-                            self.stdout.write(self.style.ERROR(f'Error deleting file {filename}: {e}'))
-        else:
+    help = (
+        "Curăță cache-ul partajat: șterge fișierele expirate și, peste bugetul de disc, pe cele folosite "
+        "cel mai de demult (LRU). Rulează incremental, câte un shard de fișiere, până la bugetul de timp."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-bytes', type=int, default=settings.CACHE_DISK_BUDGET, help='Bugetul de disc al cache-ului, în bytes')
+        parser.add_argument('--time-budget', type=float, default=20, help='Secunde per rulare; următoarea continuă de unde a rămas')
+        parser.add_argument('--full', action='store_true', help='Parcurge toate shard-urile, fără buget de timp')
+
+    def handle(self, *args, **options):
+        shared = caches['shared']
+        if hasattr(shared, 'delete_expired'):
+            # SQLiteCache: expirarea se face cu un singur DELETE
+            self.stdout.write(self.style.SUCCESS(f'{shared.delete_expired()} intrări expirate șterse.'))
+            return
+
+        cache_dir = str(settings.CACHES['shared']['LOCATION'])
+        if not os.path.exists(cache_dir):
             self.stdout.write(self.style.WARNING(f'Cache directory {cache_dir} does not exist.'))
+            return
+
+        state = self.load_state(cache_dir)
+        # Fișierele sunt distribuite uniform pe shard-uri, deci fiecare primește o parte egală din buget
+        shard_budget = options['max_bytes'] // len(SHARDS)
+        deadline = None if options['full'] else time.monotonic() + options['time_budget']
+
+        report = {'scanned': 0, 'expired': 0, 'evicted': 0, 'expired_bytes': 0, 'evicted_bytes': 0}
+        hit_ages = [0] * len(HIT_AGE_BUCKETS)
+        shards_done = 0
+        position = SHARDS.index(state.get('next_shard', SHARDS[0]))
+        entries_by_shard = self.scan(cache_dir)
+
+        while shards_done < len(SHARDS):
+            shard = SHARDS[(position + shards_done) % len(SHARDS)]
+            state['shards'][shard] = self.sweep_shard(entries_by_shard[shard], shard_budget, report, hit_ages)
+            shards_done += 1
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+
+        state['next_shard'] = SHARDS[(position + shards_done) % len(SHARDS)]
+        self.save_state(cache_dir, state)
+        self.write_report(report, hit_ages, shards_done, state)
+
+    def scan(self, cache_dir):
+        """Un singur os.scandir per rulare; fișierele sunt împărțite pe shard-uri după primul caracter."""
+        entries_by_shard = defaultdict(list)
+        with os.scandir(cache_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(CACHE_SUFFIX):
+                    entries_by_shard[entry.name[0]].append(entry)
+        return entries_by_shard
+
+    def sweep_shard(self, entries, shard_budget, report, hit_ages):
+        """Doar fișierele shard-ului sunt citite. Întoarce dimensiunea rămasă."""
+        now = time.time()
+        alive = []  # (ultimul acces, dimensiune, cale)
+        for entry in entries:
+            try:
+                stat = entry.stat()
+                expires = self.read_expiry(entry.path)
+            except FileNotFoundError:
+                continue  # Șters între timp de cache (cull, delete)
+            report['scanned'] += 1
+
+            if expires is not None and expires < now:
+                if self.remove(entry.path):
+                    report['expired'] += 1
+                    report['expired_bytes'] += stat.st_size
+                continue
+            # FileBasedCache nu scrie la citire: atime (relatime) este singurul semnal de acces
+            alive.append((max(stat.st_atime, stat.st_mtime), stat.st_size, entry.path))
+
+        size = sum(entry_size for accessed, entry_size, path in alive)
+        if size > shard_budget:
+            alive.sort()  # Cele mai vechi accese primele
+            evicted = 0
+            for accessed, entry_size, path in alive:
+                if size <= shard_budget:
+                    break
+                if self.remove(path):
+                    report['evicted'] += 1
+                    report['evicted_bytes'] += entry_size
+                size -= entry_size
+                evicted += 1
+            alive = alive[evicted:]
+
+        for accessed, entry_size, path in alive:
+            age = now - accessed
+            for index, (limit, label) in enumerate(HIT_AGE_BUCKETS):
+                if limit is None or age < limit:
+                    hit_ages[index] += 1
+                    break
+        return size
+
+    def read_expiry(self, path):
+        # O_NOATIME: citirea antetului nu trebuie să pară un acces pentru LRU
+        flags = os.O_RDONLY | getattr(os, 'O_NOATIME', 0)
+        try:
+            descriptor = os.open(path, flags)
+        except PermissionError:
+            descriptor = os.open(path, os.O_RDONLY)  # O_NOATIME cere ca procesul să fie proprietarul fișierului
+        with os.fdopen(descriptor, 'rb') as cache_file:
+            try:
+                return pickle.load(cache_file)
+            except (EOFError, pickle.UnpicklingError):
+                return 0  # Fișier gol sau corupt: tratat ca expirat, ca în FileBasedCache
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def load_state(self, cache_dir):
+        try:
+            with open(os.path.join(cache_dir, STATE_FILE)) as state_file:
+                state = json.load(state_file)
+        except (FileNotFoundError, ValueError):
+            state = {}
+        state.setdefault('shards', {})
+        return state
+
+    def save_state(self, cache_dir, state):
+        temporary_path = os.path.join(cache_dir, f'{STATE_FILE}.tmp')
+        with open(temporary_path, 'w') as state_file:
+            json.dump(state, state_file)
+        os.replace(temporary_path, os.path.join(cache_dir, STATE_FILE))
+
+    def write_report(self, report, hit_ages, shards_done, state):
+        freed = report['expired_bytes'] + report['evicted_bytes']
+        self.stdout.write(
+            f"{shards_done}/{len(SHARDS)} shard-uri parcurse, {report['scanned']} fișiere citite; "
+            f"următorul shard: {state['next_shard']}."
+        )
+        self.stdout.write(
+            f"Expirate: {report['expired']} ({report['expired_bytes']} bytes), "
+            f"evacuate LRU: {report['evicted']} ({report['evicted_bytes']} bytes)."
+        )
+        # Estimare din ultima parcurgere a fiecărui shard
+        self.stdout.write(f"Dimensiune estimată a cache-ului: {sum(state['shards'].values())} bytes.")
+        self.stdout.write('Vârsta ultimului acces pentru intrările rămase:')
+        for (limit, label), count in zip(HIT_AGE_BUCKETS, hit_ages):
+            self.stdout.write(f'  {label:>9}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'{freed} bytes eliberați.'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from api.utils import delete_old_daily_visitors, flush_listing_views
+
+class Command(BaseCommand):
+    help = "Adaugă în baza de date vizualizările anunțurilor acumulate în log (rulează periodic, ex. la fiecare minut)"
+
+    def handle(self, *args, **kwargs):
+        flushed = flush_listing_views()
+        if flushed is None:
+            self.stdout.write(self.style.WARNING('Alt flush_view_counts rulează deja.'))
+            return
+        views, listings = flushed
+        # Retenția sketch-urilor zilnice (DELETE pe indexul zilei, ieftin chiar rulat la fiecare flush)
+        expired = delete_old_daily_visitors()
+        self.stdout.write(self.style.SUCCESS(
+            f'{views} vizualizări înregistrate pentru {listings} anunțuri; {expired} sketch-uri zilnice expirate șterse.'
+        ))
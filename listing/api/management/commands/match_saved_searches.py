@@ -0,0 +1,41 @@
+from datetime import timedelta
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from api.models import ListingSearchDocument
+from api.utils import match_saved_searches
+from api.views import ListingSearchFilter
+
+# Momentul rulării precedente: sunt potrivite doar documentele indexate de atunci
+HIGH_WATER_MARK_KEY = 'saved_search_matcher:indexed_at'
+# Documentele din tranzacții încă deschise la rularea precedentă pot avea indexed_at puțin mai vechi
+HIGH_WATER_MARK_OVERLAP = timedelta(minutes=5)
+
+class Command(BaseCommand):
+    help = "Înregistrează potrivirile dintre căutările salvate și anunțurile indexate de la rularea precedentă"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Fereastra, în ore, la prima rulare sau după golirea cache-ului')
+        parser.add_argument('--batch-size', type=int, default=500, help='Numărul de anunțuri potrivite per lot')
+
+    def handle(self, *args, **options):
+        started = timezone.now()
+        since = started - timedelta(hours=options['hours'])
+        high_water_mark = cache.get(HIGH_WATER_MARK_KEY)
+        if high_water_mark is not None:
+            since = max(since, high_water_mark - HIGH_WATER_MARK_OVERLAP)
+
+        batch_size = options['batch_size']
+        documents = ListingSearchDocument.objects.filter(indexed_at__gte=since).order_by('pk')
+
+        total, batch = 0, []
+        for document in documents.iterator(chunk_size=batch_size):
+            batch.append(document)
+            if len(batch) >= batch_size:
+                total += match_saved_searches(batch, ListingSearchFilter)
+                batch = []
+        if batch:
+            total += match_saved_searches(batch, ListingSearchFilter)
+
+        cache.set(HIGH_WATER_MARK_KEY, started, None)
+        self.stdout.write(self.style.SUCCESS(f'{total} potriviri noi pentru căutările salvate (indexate din {since:%Y-%m-%d %H:%M}).'))
@@ -0,0 +1,32 @@
+import os
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from api.utils import pop_blob_dirty
+from api.views import HomeListingAPIView
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruiește feed-ul pre-serializat de pe prima pagină dacă anunțurile s-au modificat "
+        "sau dacă este mai vechi decât HOME_FEED_MAX_AGE. Se rulează periodic (ex. cron la un minut), "
+        "astfel încât mai multe modificări apropiate produc o singură reconstruire."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Reconstruiește indiferent de stare')
+
+    def handle(self, *args, **options):
+        path = settings.HOME_FEED_PATH
+        try:
+            age = time.time() - os.path.getmtime(path)
+        except FileNotFoundError:
+            age = None
+
+        # Marcajul este șters înainte de reconstruire: modificările din timpul ei îl pun la loc
+        dirty = pop_blob_dirty(path)
+        if not (options['force'] or dirty or age is None or age >= settings.HOME_FEED_MAX_AGE):
+            self.stdout.write('Feed-ul este la zi.')
+            return
+
+        content = HomeListingAPIView.materialize()
+        self.stdout.write(self.style.SUCCESS(f'Feed-ul a fost reconstruit ({len(content)} bytes).'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from api.utils import rebuild_listing_search_documents
+
+class Command(BaseCommand):
+    help = "Reconstruiește tabela ListingSearchDocument din anunțurile vizibile"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Numărul de rânduri inserate per bulk_create')
+
+    def handle(self, *args, **options):
+        count = rebuild_listing_search_documents(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{count} documente de căutare au fost reconstruite.'))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from api.caching import invalidate_tags
+from api.models import Listing, ListingSearchDocument
+
+class Command(BaseCommand):
+    help = "Recalculează like_count din tabela Like și corectează anunțurile la care contorul a deviat"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Doar afișează diferențele, fără să le corecteze')
+
+    def handle(self, *args, **options):
+        # O singură interogare grupată (LEFT JOIN + GROUP BY + HAVING): doar anunțurile cu diferențe
+        drift = (
+            Listing.objects.annotate(actual=Count('likes'))
+            .exclude(like_count=F('actual'))
+            .values_list('pk', 'like_count', 'actual')
+        )
+
+        # Corecția este relativă (F() + diferență), deci nu suprascrie toggle-urile făcute între timp
+        by_difference = {}
+        for listing_id, like_count, actual in drift:
+            by_difference.setdefault(actual - like_count, []).append(listing_id)
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{listing_id}: {like_count} -> {actual}')
+
+        fixed = sum(len(listing_ids) for listing_ids in by_difference.values())
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{fixed} anunțuri au like_count greșit.'))
+            return
+
+        for difference, listing_ids in by_difference.items():
+            Listing.objects.filter(pk__in=listing_ids).update(like_count=F('like_count') + difference)
+            invalidate_tags(*(f'listing:{listing_id}' for listing_id in listing_ids))
+
+        # Documentele de căutare copiază contorul din anunț (inclusiv cele care au deviat separat)
+        documents = ListingSearchDocument.objects.exclude(like_count=F('listing__like_count')).update(
+            like_count=Subquery(Listing.objects.filter(pk=OuterRef('listing_id')).values('like_count')[:1])
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'like_count corectat pentru {fixed} anunțuri și {documents} documente de căutare.'
+        ))
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from api.utils import invalidate_sample_pools
+
+class Command(BaseCommand):
+    help = "Invalidează pool-urile de id-uri folosite pentru anunțurile afișate aleatoriu (se reconstruiesc la prima cerere)"
+
+    def handle(self, *args, **kwargs):
+        invalidate_sample_pools()
+        self.stdout.write(self.style.SUCCESS('Pool-urile de eșantionare au fost invalidate.'))
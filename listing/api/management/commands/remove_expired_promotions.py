@@ -1,12 +1,27 @@
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.utils.timezone import now
-from api.models import Listing
+from api.caching import invalidate_tags, listing_cache_tags
+from api.models import Listing, ListingSearchDocument
+from api.utils import invalidate_sample_pools, mark_blob_dirty
 
 class Command(BaseCommand):
     help = "Dezactivează promovările expirate"
 
     def handle(self, *args, **kwargs):
         today = now().date()
-        expired_listings = Listing.objects.filter(is_promoted=True, valability_promote_date__lt=today)
-        count = expired_listings.update(is_promoted=False)  # Dezactivează promovarea
+        expired_listings = list(
+            Listing.objects.filter(is_promoted=True, valability_promote_date__lt=today)
+            .only('pk', 'category_id', 'county_id', 'city_id', 'neighborhood_id')
+        )
+        expired_ids = [listing.pk for listing in expired_listings]
+        # Dezactivează promovarea; update() nu aplică auto_now, iar updated_date versionează cardurile din cache
+        count = Listing.objects.filter(pk__in=expired_ids).update(is_promoted=False, updated_date=now())
+        # update() nu declanșează signals, deci actualizăm și documentele de căutare
+        ListingSearchDocument.objects.filter(listing_id__in=expired_ids).update(is_promoted=False)
+        if expired_ids:
+            # ...și invalidăm răspunsurile din cache (similare, fațete) și feed-ul de pe prima pagină
+            invalidate_tags(*(tag for listing in expired_listings for tag in listing_cache_tags(listing)))
+            mark_blob_dirty(settings.HOME_FEED_PATH)
+            invalidate_sample_pools()  # Pool-urile de anunțuri promovate nu mai sunt valide
         self.stdout.write(self.style.SUCCESS(f'{count} anunțuri au fost actualizate ca nefiind promovate.'))
@@ -0,0 +1,103 @@
+import re
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+from django.urls import Resolver404, resolve
+from api.models import Category, County
+
+# Doar endpoint-uri publice, fără efecte secundare (detaliul anunțului incrementează views_count,
+# confirm-email consumă token-ul etc.), și care au cache pe server (get_or_compute, cache_response
+# sau fragmente de card); celelalte ar fi doar request-uri în plus, fără nimic rămas în cache
+WARMABLE_URL_NAMES = {
+    'home-listings', 'promoted_listings', 'listing-facets', 'listing-map', 'listing-similar',
+}
+
+# Linie din log-ul nginx în format combined: "GET /api/... HTTP/1.1" 200
+ACCESS_LOG_LINE = re.compile(r'"GET (?P<path>/api/\S*) HTTP/[\d.]+" (?P<status>\d{3}) ')
+
+class Command(BaseCommand):
+    help = (
+        "Preîncălzește cache-ul după clear_cache sau un deploy: reia cele mai accesate N endpoint-uri "
+        "(din log-ul de acces și din settings.CACHE_WARMUP_URLS), în paralel, cu un număr limitat de workeri."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100, help='Numărul maxim de URL-uri reluate')
+        parser.add_argument('--workers', type=int, default=4, help='Numărul de request-uri simultane')
+        parser.add_argument('--access-log', default=settings.CACHE_WARMUP_ACCESS_LOG, help='Log nginx (format combined)')
+
+    def is_warmable(self, url):
+        try:
+            return resolve(urlsplit(url).path).url_name in WARMABLE_URL_NAMES
+        except Resolver404:
+            return False
+
+    def read_access_profile(self, path):
+        """URL-urile din log cu răspuns 200, de la cel mai accesat la cel mai puțin accesat."""
+        hits = Counter()
+        try:
+            with open(path, encoding='utf-8', errors='replace') as log:
+                for line in log:
+                    match = ACCESS_LOG_LINE.search(line)
+                    if match and match.group('status') == '200':
+                        hits[match.group('path')] += 1
+        except FileNotFoundError:
+            self.stdout.write(self.style.WARNING(f'Log-ul de acces {path} nu există.'))
+        return [url for url, count in hits.most_common()]
+
+    def expand_configured_urls(self):
+        values = {
+            'county': lambda: County.objects.order_by('name').values_list('slug', flat=True),
+            'category': lambda: Category.objects.filter(parent__isnull=True).order_by('pk').values_list('pk', flat=True),
+        }
+        urls = []
+        for template in settings.CACHE_WARMUP_URLS:
+            names = [name for name in values if f'{{{name}}}' in template]
+            if not names:
+                urls.append(template)
+                continue
+            for value in values[names[0]]():
+                urls.append(template.replace(f'{{{names[0]}}}', str(value)))
+        return urls
+
+    def warm(self, url):
+        api_url = urlsplit(settings.API_URL)
+        # Același host ca în producție, ca URL-urile absolute din răspunsurile cache-uite să fie corecte
+        client = Client(raise_request_exception=False, HTTP_HOST=api_url.netloc)
+        started = time.monotonic()
+        try:
+            response = client.get(url, secure=api_url.scheme == 'https')
+            return url, response.status_code, time.monotonic() - started
+        finally:
+            connections.close_all()  # Fiecare thread are conexiunile lui la baza de date
+
+    def handle(self, *args, **options):
+        candidates = []
+        if options['access_log']:
+            candidates += self.read_access_profile(options['access_log'])
+        candidates += self.expand_configured_urls()
+
+        urls = []
+        for url in candidates:
+            if url not in urls and self.is_warmable(url):
+                urls.append(url)
+        urls = urls[:options['limit']]
+
+        started = time.monotonic()
+        failed = 0
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as executor:
+            for url, status_code, duration in executor.map(self.warm, urls):
+                if status_code == 200:
+                    self.stdout.write(f'{status_code} {duration * 1000:7.0f} ms  {url}')
+                else:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(f'{status_code} {duration * 1000:7.0f} ms  {url}'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(urls) - failed}/{len(urls)} URL-uri preîncălzite în {time.monotonic() - started:.1f} s.'
+        ))
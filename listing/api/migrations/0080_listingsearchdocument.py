@@ -0,0 +1,51 @@
+# Generated by Django 5.1.2 on 2026-10-18 06:24
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0079_alter_listing_clasa_energetica'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingSearchDocument',
+            fields=[
+                ('listing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='api.listing')),
+                ('price', models.PositiveIntegerField()),
+                ('suprafata_utila', models.FloatField(blank=True, null=True)),
+                ('year_of_construction', models.IntegerField(blank=True, null=True)),
+                ('floor', models.SmallIntegerField(blank=True, choices=[(0, 'Demisol'), (1, 'Parter'), (2, 'Etaj 1'), (3, 'Etaj 2'), (4, 'Etaj 3'), (5, 'Etaj 4'), (6, 'Etaj 5'), (7, 'Etaj 6'), (8, 'Etaj 7'), (9, 'Etaj 8'), (10, 'Etaj 9'), (11, 'Etaj 10'), (12, 'Etaj 11'), (13, 'Etaj 12'), (14, 'Etaj 13'), (15, 'Etaj 14'), (16, 'Etaj 15'), (17, 'Etaj 16'), (18, 'Etaj 17'), (19, 'Etaj 18'), (20, 'Etaj 19'), (21, 'Etaj 20'), (22, 'Etaj 21+'), (23, 'Ultimul etaj'), (24, 'Mansardă')], null=True)),
+                ('is_promoted', models.BooleanField(default=False)),
+                ('username_hash', models.CharField(blank=True, db_index=True, max_length=8, null=True)),
+                ('valability_end_date', models.DateField()),
+                ('created_date', models.DateTimeField()),
+                ('like_count', models.IntegerField(default=0)),
+                ('views_count', models.BigIntegerField(default=0)),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField(blank=True)),
+                ('negociabil', models.BooleanField(default=False)),
+                ('slug', models.SlugField(db_index=False, max_length=160)),
+                ('thumbnail', models.CharField(blank=True, max_length=100, null=True)),
+                ('numar_camere', models.IntegerField(blank=True, choices=[(1, '1 cameră'), (2, '2 camere'), (3, '3 camere'), (4, '4 camere'), (5, '5+ camere')], null=True)),
+                ('zonare', models.SmallIntegerField(blank=True, choices=[(0, 'Intravilan'), (1, 'Extravilan')], null=True)),
+                ('buyer_commission', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=4)),
+                ('neighborhood_name', models.CharField(blank=True, max_length=100, null=True)),
+                ('category_name', models.CharField(blank=True, max_length=60, null=True)),
+                ('phone_number', models.CharField(blank=True, max_length=128, null=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.category')),
+                ('city', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.city')),
+                ('county', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.county')),
+                ('neighborhood', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.neighborhood')),
+            ],
+            options={
+                'verbose_name': 'Listing search document',
+                'verbose_name_plural': 'Listing search documents',
+                'ordering': ['-created_date'],
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.1.2 on 2026-10-18 06:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0080_listingsearchdocument'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='listingsearchdocument',
+            name='category',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.category'),
+        ),
+        migrations.AlterField(
+            model_name='listingsearchdocument',
+            name='city',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.city'),
+        ),
+        migrations.AddIndex(
+            model_name='listingsearchdocument',
+            index=models.Index(fields=['created_date', 'listing'], name='lsd_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingsearchdocument',
+            index=models.Index(fields=['category', 'created_date', 'listing'], name='lsd_cat_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingsearchdocument',
+            index=models.Index(fields=['city', 'created_date', 'listing'], name='lsd_city_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingsearchdocument',
+            index=models.Index(fields=['category', 'city', 'created_date', 'listing'], name='lsd_cat_city_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingsearchdocument',
+            index=models.Index(fields=['like_count', 'listing'], name='lsd_likes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingsearchdocument',
+            index=models.Index(fields=['category', 'like_count', 'listing'], name='lsd_cat_likes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingsearchdocument',
+            index=models.Index(fields=['city', 'like_count', 'listing'], name='lsd_city_likes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingsearchdocument',
+            index=models.Index(fields=['category', 'city', 'like_count', 'listing'], name='lsd_cat_city_likes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingsearchdocument',
+            index=models.Index(fields=['views_count', 'listing'], name='lsd_views_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingsearchdocument',
+            index=models.Index(fields=['category', 'views_count', 'listing'], name='lsd_cat_views_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingsearchdocument',
+            index=models.Index(fields=['city', 'views_count', 'listing'], name='lsd_city_views_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingsearchdocument',
+            index=models.Index(fields=['category', 'city', 'views_count', 'listing'], name='lsd_cat_city_views_idx'),
+        ),
+    ]
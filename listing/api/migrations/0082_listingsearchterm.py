@@ -0,0 +1,27 @@
+# Generated by Django 5.1.2 on 2026-10-18 06:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0081_listingsearchdocument_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=40)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='api.listingsearchdocument')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'document', 'weight'], name='lst_term_idx')],
+                'unique_together': {('document', 'term')},
+            },
+        ),
+    ]
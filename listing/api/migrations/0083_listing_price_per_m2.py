@@ -0,0 +1,39 @@
+# Generated by Django 5.1.2 on 2026-10-18 06:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0082_listingsearchterm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='price_per_m2',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=2, editable=False, max_digits=12, null=True, verbose_name='Preț pe m²'),
+        ),
+        migrations.AddField(
+            model_name='listingsearchdocument',
+            name='price_per_m2',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='listingsearchdocument',
+            index=models.Index(fields=['price_per_m2', 'listing'], name='lsd_ppm2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingsearchdocument',
+            index=models.Index(fields=['category', 'price_per_m2', 'listing'], name='lsd_cat_ppm2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingsearchdocument',
+            index=models.Index(fields=['city', 'price_per_m2', 'listing'], name='lsd_city_ppm2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingsearchdocument',
+            index=models.Index(fields=['category', 'city', 'price_per_m2', 'listing'], name='lsd_cat_city_ppm2_idx'),
+        ),
+    ]
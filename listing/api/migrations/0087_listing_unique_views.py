@@ -0,0 +1,57 @@
+# Generated by Django 5.1.2 on 2026-10-18 07:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0086_table_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingDailyVisitors',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('sketch', models.BinaryField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='unique_views',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='listingsearchdocument',
+            name='unique_views',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='listingsearchdocument',
+            index=models.Index(fields=['unique_views', 'listing'], name='lsd_uviews_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingsearchdocument',
+            index=models.Index(fields=['category', 'unique_views', 'listing'], name='lsd_cat_uviews_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingsearchdocument',
+            index=models.Index(fields=['city', 'unique_views', 'listing'], name='lsd_city_uviews_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingsearchdocument',
+            index=models.Index(fields=['category', 'city', 'unique_views', 'listing'], name='lsd_cat_city_uviews_idx'),
+        ),
+        migrations.AddField(
+            model_name='listingdailyvisitors',
+            name='listing',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_visitors', to='api.listing'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='listingdailyvisitors',
+            unique_together={('listing', 'day')},
+        ),
+    ]
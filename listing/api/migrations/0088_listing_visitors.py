@@ -0,0 +1,46 @@
+# Generated by Django 5.1.2 on 2026-10-18 07:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from api.hyperloglog import HyperLogLog
+
+
+def build_cumulative_sketches(apps, schema_editor):
+    # Sketch-ul cumulat pornește din reuniunea sketch-urilor zilnice existente
+    ListingDailyVisitors = apps.get_model('api', 'ListingDailyVisitors')
+    ListingVisitors = apps.get_model('api', 'ListingVisitors')
+    sketches = {}
+    for listing_id, data in ListingDailyVisitors.objects.values_list('listing_id', 'sketch').iterator():
+        sketch = HyperLogLog.from_bytes(data)
+        if listing_id in sketches:
+            sketches[listing_id].merge(sketch)
+        else:
+            sketches[listing_id] = sketch
+    ListingVisitors.objects.bulk_create(
+        [ListingVisitors(listing_id=listing_id, sketch=sketch.to_bytes()) for listing_id, sketch in sketches.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0087_listing_unique_views'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingVisitors',
+            fields=[
+                ('listing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='visitors', serialize=False, to='api.listing')),
+                ('sketch', models.BinaryField()),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='listingdailyvisitors',
+            name='day',
+            field=models.DateField(db_index=True),
+        ),
+        migrations.RunPython(build_cumulative_sketches, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.utils.text import slugify
 
 # for resize images
@@ -573,6 +573,7 @@ class Listing(models.Model):
     )
     notified_on_expiry = models.BooleanField(default=False)  # Nou câmp pentru tracking-ul notificărilor   
     views_count = models.BigIntegerField(default=0)
+    unique_views = models.BigIntegerField(default=0)  # Vizitatori unici estimați (HyperLogLog), vezi ListingDailyVisitors
     like_count = models.IntegerField(default=0)
     
     # Machine learning statistics
@@ -585,6 +586,14 @@ class Listing(models.Model):
         null=True,
         blank=True
     )       
+    # Calculat în save() din price și suprafata_utila, pentru filtrare și ordonare indexată
+    price_per_m2 = models.DecimalField(
+        "Preț pe m²",
+        max_digits=12, decimal_places=2,
+        null=True, blank=True,
+        db_index=True,
+        editable=False
+    )
     suprafata_terenului = models.FloatField(
         "Suprafață terenului",
         null=True,
@@ -678,26 +687,50 @@ class Listing(models.Model):
             # Creează baza slug-ului
             slug_base = slugify(f"{self.title} {self.county.name} {self.city.name} {user_hash}")
             self.slug = slug_base                         
+
+        # Prețul pe m² se recalculează la fiecare salvare; dacă se salvează doar câmpurile
+        # din care este derivat, îl includem și pe el în update_fields
+        self.price_per_m2 = self.compute_price_per_m2()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'price', 'suprafata_utila'}.intersection(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'price_per_m2'}
                         
          # Apelul la save-ul efectiv al anunțului
         super(Listing, self).save(*args, **kwargs) 
+
+    def compute_price_per_m2(self):
+        """Prețul pe m² util, rotunjit la 2 zecimale (None fără suprafață utilă)."""
+        if self.price is None or not self.suprafata_utila or self.suprafata_utila <= 0:
+            return None
+        return (Decimal(self.price) / Decimal(str(self.suprafata_utila))).quantize(Decimal('0.01'))
         
     # Metodă pentru gestionarea like-urilor
     def toggle_like(self, user):
-        # Verifică dacă utilizatorul a dat deja like
-        like, created = Like.objects.get_or_create(user=user, listing=self)
-
-        if not created:
-            # Dacă like-ul există deja, îl eliminăm
-            like.delete()
-            self.like_count -= 1  # Scădem 1 din like_count
-        else:
-            # Dacă like-ul nu există, îl adăugăm
-            self.like_count += 1  # Adăugăm 1 la like_count
+        """
+        Adaugă sau elimină like-ul utilizatorului. Contoarele sunt modificate cu UPDATE ... F() în aceeași
+        tranzacție cu rândul din Like, fără save() (deci fără semnalele post_save ale anunțului).
+        """
+        with transaction.atomic():
+            # DELETE-ul decide atomic dacă like-ul exista; două toggle-uri simultane nu pot șterge același rând
+            deleted, _ = Like.objects.filter(user=user, listing=self).delete()
+            if deleted:
+                created, increment = False, -1
+            else:
+                try:
+                    with transaction.atomic():
+                        Like.objects.create(user=user, listing=self)
+                    created, increment = True, 1
+                except IntegrityError:
+                    # Un toggle simultan a adăugat deja like-ul (și a incrementat contorul)
+                    created, increment = True, 0
+
+            if increment:
+                Listing.objects.filter(pk=self.pk).update(like_count=models.F('like_count') + increment)
+                ListingSearchDocument.objects.filter(listing_id=self.pk).update(
+                    like_count=models.F('like_count') + increment
+                )
+        self.refresh_from_db(fields=['like_count'])
 
-        # Salvează actualizarea în baza de date
-        self.save(update_fields=['like_count'])
-        
         return created  # Returnează True dacă like-ul a fost adăugat, False dacă a fost eliminat   
     
     def renew_if_needed(self):
@@ -717,7 +750,188 @@ class Listing(models.Model):
         verbose_name = "Listing"
         verbose_name_plural = "Listings"
         ordering = ['-created_date']
-        
+
+class ListingSearchDocument(models.Model):
+    """
+    Model de citire îngust pentru lista de anunțuri: un rând per anunț vizibil
+    (activ și neascuns de utilizator), doar cu coloanele de filtrare, ordonare
+    și câmpurile afișate în card. Este sincronizat din signals la salvare/ștergere.
+    """
+    listing = models.OneToOneField(
+        Listing,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_document'
+    )
+
+    # Câmpuri pentru filtrare (category și city sunt acoperite de indexurile compuse din Meta)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+', db_index=False)
+    county = models.ForeignKey(County, on_delete=models.CASCADE, related_name='+')
+    city = models.ForeignKey(City, on_delete=models.CASCADE, related_name='+', db_index=False)
+    neighborhood = models.ForeignKey(Neighborhood, on_delete=models.SET_NULL, related_name='+', null=True, blank=True)
+    price = models.PositiveIntegerField()
+    suprafata_utila = models.FloatField(null=True, blank=True)
+    price_per_m2 = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    year_of_construction = models.IntegerField(null=True, blank=True)
+    floor = models.SmallIntegerField(choices=FLOOR_CHOICES, null=True, blank=True)
+    is_promoted = models.BooleanField(default=False)
+    username_hash = models.CharField(max_length=8, blank=True, null=True, db_index=True)
+    valability_end_date = models.DateField()
+
+    # Câmpuri pentru căutarea geografică (geohash-ul permite preselecția prin prefix pe index)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    geohash = models.CharField(max_length=12, null=True, blank=True, db_index=True)
+
+    # Momentul în care anunțul a devenit vizibil (folosit pentru alertele căutărilor salvate)
+    indexed_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    # Câmpuri pentru ordonare
+    created_date = models.DateTimeField()
+    like_count = models.IntegerField(default=0)
+    views_count = models.BigIntegerField(default=0)
+    unique_views = models.BigIntegerField(default=0)
+
+    # Câmpuri pentru card (copiate din Listing, User, Category și Neighborhood)
+    title = models.CharField(max_length=200)
+    description = models.TextField(blank=True)
+    negociabil = models.BooleanField(default=False)
+    slug = models.SlugField(max_length=160, db_index=False)
+    thumbnail = models.CharField(max_length=100, blank=True, null=True)
+    numar_camere = models.IntegerField(choices=NUMAR_CAMERE_CHOICES, null=True, blank=True)
+    zonare = models.SmallIntegerField(choices=ZONARE_CHOICES, null=True, blank=True)
+    buyer_commission = models.DecimalField(max_digits=4, decimal_places=2, default=Decimal('0.00'))
+    neighborhood_name = models.CharField(max_length=100, blank=True, null=True)
+    category_name = models.CharField(max_length=60, blank=True, null=True)
+    phone_number = models.CharField(max_length=128, blank=True, null=True)
+
+    def __str__(self):
+        return self.title
+
+    class Meta:
+        verbose_name = "Listing search document"
+        verbose_name_plural = "Listing search documents"
+        ordering = ['-created_date']
+        # Pentru fiecare ordonare din ListingFilter: (filtre de egalitate, câmp de ordonare, id).
+        # Id-ul de la final permite ordonarea stabilă (și paginarea cu cursor) fără filesort.
+        # Filtrele de interval (preț, suprafață, valabilitate) se aplică pe parcursul indexului.
+        indexes = [
+            models.Index(fields=['created_date', 'listing'], name='lsd_created_idx'),
+            models.Index(fields=['category', 'created_date', 'listing'], name='lsd_cat_created_idx'),
+            models.Index(fields=['city', 'created_date', 'listing'], name='lsd_city_created_idx'),
+            models.Index(fields=['category', 'city', 'created_date', 'listing'], name='lsd_cat_city_created_idx'),
+            models.Index(fields=['like_count', 'listing'], name='lsd_likes_idx'),
+            models.Index(fields=['category', 'like_count', 'listing'], name='lsd_cat_likes_idx'),
+            models.Index(fields=['city', 'like_count', 'listing'], name='lsd_city_likes_idx'),
+            models.Index(fields=['category', 'city', 'like_count', 'listing'], name='lsd_cat_city_likes_idx'),
+            models.Index(fields=['views_count', 'listing'], name='lsd_views_idx'),
+            models.Index(fields=['category', 'views_count', 'listing'], name='lsd_cat_views_idx'),
+            models.Index(fields=['city', 'views_count', 'listing'], name='lsd_city_views_idx'),
+            models.Index(fields=['category', 'city', 'views_count', 'listing'], name='lsd_cat_city_views_idx'),
+            models.Index(fields=['unique_views', 'listing'], name='lsd_uviews_idx'),
+            models.Index(fields=['category', 'unique_views', 'listing'], name='lsd_cat_uviews_idx'),
+            models.Index(fields=['city', 'unique_views', 'listing'], name='lsd_city_uviews_idx'),
+            models.Index(fields=['category', 'city', 'unique_views', 'listing'], name='lsd_cat_city_uviews_idx'),
+            models.Index(fields=['price_per_m2', 'listing'], name='lsd_ppm2_idx'),
+            models.Index(fields=['category', 'price_per_m2', 'listing'], name='lsd_cat_ppm2_idx'),
+            models.Index(fields=['city', 'price_per_m2', 'listing'], name='lsd_city_ppm2_idx'),
+            models.Index(fields=['category', 'city', 'price_per_m2', 'listing'], name='lsd_cat_city_ppm2_idx'),
+        ]
+
+class ListingSearchTerm(models.Model):
+    """
+    Index inversat pentru căutarea text: un rând per termen (fără diacritice, cu stemming)
+    din titlul și descrierea unui document de căutare.
+    """
+    document = models.ForeignKey(ListingSearchDocument, on_delete=models.CASCADE, related_name='terms')
+    term = models.CharField(max_length=40)
+    weight = models.PositiveSmallIntegerField(default=1)  # Aparițiile din titlu contează mai mult
+
+    def __str__(self):
+        return self.term
+
+    class Meta:
+        unique_together = ('document', 'term')
+        indexes = [
+            models.Index(fields=['term', 'document', 'weight'], name='lst_term_idx'),
+        ]
+
+class ListingDailyVisitors(models.Model):
+    """
+    Vizitatorii unici ai unui anunț într-o zi: sketch HyperLogLog (api.hyperloglog) comprimat.
+    Sketch-urile mai multor zile se unesc pentru vizitatorii unici pe orice interval.
+    """
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='daily_visitors')
+    day = models.DateField(db_index=True)  # Pentru ștergerea zilelor mai vechi decât VISITOR_SKETCH_RETENTION_DAYS
+    sketch = models.BinaryField()
+
+    def __str__(self):
+        return f'{self.listing_id} {self.day}'
+
+    class Meta:
+        unique_together = ('listing', 'day')
+
+class ListingVisitors(models.Model):
+    """
+    Sketch-ul cumulat (toate zilele) al vizitatorilor unui anunț, din care se calculează unique_views;
+    la flush se adaugă doar hash-urile noi, fără a reciti sketch-urile zilnice.
+    """
+    listing = models.OneToOneField(Listing, on_delete=models.CASCADE, primary_key=True, related_name='visitors')
+    sketch = models.BinaryField()
+
+    def __str__(self):
+        return str(self.listing_id)
+
+class SavedSearch(models.Model):
+    """
+    Căutare salvată de un utilizator: parametrii din ListingFilter, pentru alerte la anunțuri noi.
+    Categoria și orașul sunt copiate din parametri pentru indexul folosit de matcher.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='saved_searches')
+    name = models.CharField(max_length=100, blank=True)
+    params = models.JSONField(default=dict)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    city = models.ForeignKey(City, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def save(self, *args, **kwargs):
+        # Categoria și orașul sunt derivate din parametri, ca să nu poată diverge
+        self.category_id = self.get_int_param('category')
+        self.city_id = self.get_int_param('city')
+        super().save(*args, **kwargs)
+
+    def get_int_param(self, name):
+        try:
+            return int(self.params.get(name))
+        except (TypeError, ValueError):
+            return None
+
+    def __str__(self):
+        return self.name or f'Căutare salvată #{self.pk}'
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_active', 'category', 'city'], name='saved_search_match_idx'),
+        ]
+
+class SavedSearchMatch(models.Model):
+    """
+    Un anunț nou care corespunde unei căutări salvate; notified_at este completat la trimiterea alertei.
+    """
+    saved_search = models.ForeignKey(SavedSearch, on_delete=models.CASCADE, related_name='matches')
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='saved_search_matches')
+    created_at = models.DateTimeField(auto_now_add=True)
+    notified_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    def __str__(self):
+        return f'{self.saved_search} - {self.listing.title}'
+
+    class Meta:
+        ordering = ['-created_at']
+        unique_together = ('saved_search', 'listing')
+
 class ImageHash(models.Model):
     hash_value = models.CharField(max_length=64, unique=True)
     listing_uuid = models.UUIDField(null=True, blank=True)  # Folosind UUID-ul pentru asocierea cu listing
@@ -944,6 +1158,25 @@ class TermsPolicyHistory(models.Model):
     def __str__(self):
         return f"History of {self.section.section_number} - {self.section.title} at {self.modified_at}"    
 
+
+class TableVersion(models.Model):
+    """
+    Ștampilă de versiune per tabelă (nomenclatoare, politici), incrementată la orice modificare.
+    Folosită ca validator ieftin (ETag/Last-Modified) pentru endpoint-urile care listează tabela.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    version = models.PositiveBigIntegerField(default=1)
+    updated_at = models.DateTimeField(default=now)
+
+    @classmethod
+    def bump(cls, name):
+        # UPDATE atomic; rândul este creat la prima modificare a tabelei
+        if not cls.objects.filter(name=name).update(version=models.F('version') + 1, updated_at=now()):
+            cls.objects.get_or_create(name=name, defaults={'updated_at': now()})
+
+    def __str__(self):
+        return f'{self.name} v{self.version}'
+
          
 class ManagementCommand(models.Model):
     name = models.CharField(max_length=255)
@@ -19,6 +19,7 @@ from django.utils.timezone import localtime, make_aware
 
 # for custom variables
 from django.conf import settings
+from django.core.files.storage import default_storage
 
 # for hashing
 from .utils import generate_hash
@@ -1263,6 +1264,7 @@ class ListingDetailSerializer(serializers.ModelSerializer):
             'has_attic', 
             'clasa_energetica_display',           
             'views_count',
+            'unique_views',
             'like_count',
             'slug',
             'county_name',
@@ -1289,6 +1291,7 @@ class ListingMinimalSerializer(serializers.ModelSerializer):
     class Meta:
         model = Listing
         fields = [
+            'id',
             'title',
             'description',
             'price',
@@ -1306,6 +1309,11 @@ class ListingMinimalSerializer(serializers.ModelSerializer):
             'buyer_commission',
             'is_promoted',
         ]
+        # Ce citesc câmpurile calculate, pentru optimize_for_serializer
+        extra_sources = {
+            'phone_number': ['user.phone_number'],
+            'floor_display': ['floor'],
+        }
         
         
     def get_phone_number(self, obj):
@@ -1322,6 +1330,80 @@ class ListingMinimalSerializer(serializers.ModelSerializer):
     def get_floor_display(self, obj):
         return obj.get_floor_display()
  
+class ListingSearchDocumentSerializer(serializers.ModelSerializer):
+    """
+    Produce același card ca ListingMinimalSerializer, dar citește din ListingSearchDocument,
+    fără join-uri către user, neighborhood sau category.
+    """
+    thumbnail = serializers.SerializerMethodField()
+    suprafata_utila = serializers.SerializerMethodField()
+    floor_display = serializers.CharField(source='get_floor_display', read_only=True)
+    zonare_display = serializers.CharField(source='get_zonare_display', read_only=True)
+    distance_km = serializers.SerializerMethodField()
+    id = serializers.UUIDField(source='listing_id', read_only=True)  # Același id ca în ListingMinimalSerializer
+
+    class Meta:
+        model = ListingSearchDocument
+        fields = [
+            'id',
+            'title',
+            'description',
+            'price',
+            'negociabil',
+            'slug',
+            'thumbnail',
+            'numar_camere',
+            'like_count',
+            'neighborhood_name',
+            'category_name',
+            'phone_number',
+            'suprafata_utila',
+            'zonare_display',
+            'floor_display',
+            'buyer_commission',
+            'is_promoted',
+            'distance_km',
+        ]
+        # distance_km există doar la căutarea cu near= (adnotare), nu citește coloane
+        extra_sources = {
+            'distance_km': [],
+        }
+
+    def get_thumbnail(self, obj):
+        # Același format ca ImageField din DRF: URL absolut dacă avem request
+        if not obj.thumbnail:
+            return None
+        url = default_storage.url(obj.thumbnail)
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+    def get_suprafata_utila(self, obj):
+        return round(obj.suprafata_utila) if obj.suprafata_utila is not None else None
+
+    def get_distance_km(self, obj):
+        distance = getattr(obj, 'distance_km', None)
+        return round(distance, 2) if distance is not None else None
+
+class SavedSearchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SavedSearch
+        fields = ['id', 'name', 'params', 'is_active', 'created_at']
+        read_only_fields = ['id', 'created_at']
+
+    def validate_params(self, value):
+        """
+        Parametrii sunt perechi nume -> valoare simplă, ca într-un query string.
+        Validarea față de ListingFilter se face în view.
+        """
+        if not isinstance(value, dict):
+            raise serializers.ValidationError("Parametrii trebuie să fie un obiect JSON.")
+        for name, param in value.items():
+            if isinstance(param, (dict, list)):
+                raise serializers.ValidationError(f"Valoarea pentru {name} trebuie să fie simplă.")
+        return {name: str(param) for name, param in value.items() if param not in (None, '')}
+
 class ReportSerializer(serializers.ModelSerializer):
     listing = serializers.PrimaryKeyRelatedField(queryset=Listing.objects.all())
 
@@ -1,14 +1,15 @@
-from django.db.models.signals import pre_save, pre_delete, post_save, post_delete
+from django.db.models.signals import pre_save, pre_delete, post_save, post_delete, m2m_changed
 from django.dispatch import receiver
-from api.models import User, ImageHash, Listing, ListingActivityLog, UserActivityLog
+from api.models import User, ImageHash, Listing, ListingActivityLog, UserActivityLog, ListingSearchDocument, Category, Neighborhood
+from api.models import County, City, Tag, PrivacyPolicySection, PrivacyPolicyHistory, TermsPolicySection, TermsPolicyHistory
+from api.utils import sync_listing_search_document, invalidate_map_tiles, invalidate_sample_pools, mark_blob_dirty
+from api.caching import invalidate_tags, listing_cache_tags, bump_table_version
 import os
 from PIL import Image
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 
-# for clear cache
 import os
-import shutil
 from django.conf import settings
 
 @receiver(pre_save, sender=User)
@@ -56,7 +57,7 @@ def delete_files_on_listing_delete(sender, instance, **kwargs):
                 break  # Oprire buclă după ce am șters toate instanțele    
             
 @receiver(post_save, sender=Listing)
-def generate_or_update_thumbnail_and_clear_cache(sender, instance, created, **kwargs):
+def generate_or_update_thumbnail(sender, instance, created, **kwargs):
     # Generare thumbnail
     if instance.photo1:  # Asigură-te că există o imagine în photo1
         photo1_path = instance.photo1.path
@@ -77,16 +78,117 @@ def generate_or_update_thumbnail_and_clear_cache(sender, instance, created, **kw
         if instance.thumbnail.name != relative_thumbnail_path:
             instance.thumbnail.name = relative_thumbnail_path
             instance.save(update_fields=['thumbnail'])
-    
-    # Curățare cache dacă statusul este activ
-    if instance.status == 1:  # 1 = Active
-        cache_dir = settings.CACHES['default']['LOCATION']
-        if os.path.exists(cache_dir):
-            shutil.rmtree(cache_dir)
-            os.makedirs(cache_dir)
-        else:
-            print(f'Cache directory {cache_dir} does not exist.')
-                       
+
+# Câmpurile din Listing copiate în ListingSearchDocument
+SEARCH_DOCUMENT_SOURCE_FIELDS = {
+    'status', 'is_active_by_user', 'category', 'county', 'city', 'neighborhood', 'price',
+    'suprafata_utila', 'price_per_m2', 'year_of_construction', 'floor', 'is_promoted', 'valability_end_date',
+    'like_count', 'views_count', 'unique_views', 'title', 'description', 'negociabil', 'slug', 'thumbnail',
+    'numar_camere', 'zonare', 'buyer_commission', 'user', 'latitude', 'longitude',
+}
+
+@receiver(post_save, sender=Listing)
+def sync_search_document(sender, instance, update_fields=None, **kwargs):
+    # Sărim peste salvările care nu ating niciun câmp din documentul de căutare
+    if update_fields is not None and not SEARCH_DOCUMENT_SOURCE_FIELDS.intersection(update_fields):
+        # Listele nu sunt afectate; doar răspunsurile cache-uite ale anunțului însuși
+        invalidate_tags(f'listing:{instance.pk}')
+        return
+    # Invalidează și tag-urile de cache (anunț, categorie, zone) dacă s-a schimbat ceva vizibil
+    sync_listing_search_document(instance)
+
+@receiver(post_delete, sender=Listing)
+def invalidate_cache_tags_on_listing_delete(sender, instance, **kwargs):
+    invalidate_tags(*listing_cache_tags(instance))
+
+# Câmpurile din Listing care decid dacă un anunț intră într-un pool de eșantionare
+SAMPLE_POOL_SOURCE_FIELDS = {
+    'status', 'is_active_by_user', 'is_promoted', 'valability_end_date', 'category', 'county', 'city',
+    'neighborhood', 'price', 'suprafata_utila', 'price_per_m2', 'year_of_construction', 'floor', 'user',
+}
+
+@receiver(post_save, sender=Listing)
+def invalidate_sample_pools_on_listing_save(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or SAMPLE_POOL_SOURCE_FIELDS.intersection(update_fields):
+        invalidate_sample_pools()
+
+@receiver(post_delete, sender=Listing)
+def invalidate_sample_pools_on_listing_delete(sender, instance, **kwargs):
+    invalidate_sample_pools()
+
+@receiver(post_save, sender=Listing)
+def mark_home_feed_dirty_on_listing_save(sender, instance, created, update_fields=None, **kwargs):
+    # Feed-ul conține doar câmpuri din documentul de căutare; restul salvărilor nu îl afectează
+    if created or update_fields is None or SEARCH_DOCUMENT_SOURCE_FIELDS.intersection(update_fields):
+        mark_blob_dirty(settings.HOME_FEED_PATH)
+
+@receiver(post_delete, sender=Listing)
+def mark_home_feed_dirty_on_listing_delete(sender, instance, **kwargs):
+    mark_blob_dirty(settings.HOME_FEED_PATH)
+
+@receiver(post_delete, sender=Listing)
+def invalidate_map_tiles_on_listing_delete(sender, instance, **kwargs):
+    # Documentul de căutare este șters în cascadă; tile-urile care îl conțineau trebuie recalculate
+    if instance.latitude is not None and instance.longitude is not None:
+        invalidate_map_tiles((instance.latitude, instance.longitude))
+
+# Câmpurile utilizatorului copiate în documentele de căutare ale anunțurilor lui
+SEARCH_DOCUMENT_USER_FIELDS = ('username_hash', 'phone_number')
+
+@receiver(pre_save, sender=User)
+def remember_search_document_user_fields(sender, instance, update_fields=None, **kwargs):
+    # Login-ul și refresh-ul de token salvează doar last_login: nu citim nimic în plus
+    if not instance.pk or (update_fields is not None and not set(update_fields) & set(SEARCH_DOCUMENT_USER_FIELDS)):
+        instance._old_search_document_fields = None
+        return
+    instance._old_search_document_fields = (
+        sender.objects.filter(pk=instance.pk).values_list(*SEARCH_DOCUMENT_USER_FIELDS).first()
+    )
+
+@receiver(post_save, sender=User)
+def sync_search_document_user_fields(sender, instance, created, **kwargs):
+    old_values = getattr(instance, '_old_search_document_fields', None)
+    if created or old_values is None:
+        return
+    if old_values == tuple(getattr(instance, field) for field in SEARCH_DOCUMENT_USER_FIELDS):
+        return
+    ListingSearchDocument.objects.filter(listing__user=instance).update(
+        username_hash=instance.username_hash,
+        phone_number=str(instance.phone_number) if instance.phone_number else None,
+    )
+
+@receiver(post_save, sender=Category)
+def sync_search_document_category_name(sender, instance, created, **kwargs):
+    if created:
+        return
+    ListingSearchDocument.objects.filter(category=instance).update(category_name=instance.name)
+    invalidate_tags(f'category:{instance.pk}')
+
+@receiver(post_save, sender=Neighborhood)
+def sync_search_document_neighborhood_name(sender, instance, created, **kwargs):
+    if created:
+        return
+    ListingSearchDocument.objects.filter(neighborhood=instance).update(neighborhood_name=instance.name)
+    invalidate_tags(f'neighborhood:{instance.pk}')
+
+# Tabelele cu ștampilă de versiune (TableVersion), folosite ca ETag de endpoint-urile de nomenclatoare și politici
+VERSIONED_TABLES = (
+    Category, County, City, Neighborhood, Tag,
+    PrivacyPolicySection, PrivacyPolicyHistory, TermsPolicySection, TermsPolicyHistory,
+)
+
+def bump_table_version_on_change(sender, **kwargs):
+    bump_table_version(sender)
+
+for model in VERSIONED_TABLES:
+    post_save.connect(bump_table_version_on_change, sender=model)
+    post_delete.connect(bump_table_version_on_change, sender=model)
+
+@receiver(m2m_changed, sender=Listing.tag.through)
+def touch_listing_on_tag_change(sender, instance, action, reverse, **kwargs):
+    # Tag-urile fac parte din detaliul anunțului: updated_date (validatorul lui) trebuie să se schimbe
+    if action in ('post_add', 'post_remove', 'post_clear') and not reverse:
+        Listing.objects.filter(pk=instance.pk).update(updated_date=timezone.now())
 
 @receiver(post_save, sender=Listing)
 def log_listing_activity(sender, instance, created, **kwargs):
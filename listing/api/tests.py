@@ -1,3 +1,313 @@
-from django.test import TestCase
+import hashlib
+import itertools
+import json
+import re
+import tempfile
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import connection
+from django.http import QueryDict
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils.timezone import now
+from rest_framework.test import APIClient
+
+from .cache_backends import TwoTierCache
+from .hyperloglog import HyperLogLog
+from .models import *
+from .utils import rebuild_listing_search_documents
+from .views import ListingAPIView
+
+# Nivelul partajat din settings este un FileBasedCache din listing/cache: testele nu scriu acolo
+# și nu pornesc cu starea rămasă de la rulările precedente
+TEST_CACHES = {
+    **settings.CACHES,
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'api-tests'},
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ListingFilterQueryPlanTests(TestCase):
+    """
+    Rulează EXPLAIN pentru fiecare combinație de filtre și ordonare din ListingFilter
+    și eșuează dacă vreuna ajunge la full table scan sau filesort.
+    """
+    filter_params = {
+        'category': lambda data: str(data['category'].pk),
+        'city': lambda data: str(data['city'].pk),
+        'price': lambda data: 'price_min=50000&price_max=150000',
+        'suprafata_utila': lambda data: 'suprafata_utila_min=40&suprafata_utila_max=90',
+    }
+    # price_per_m2_min/max nu este inclus: coloana are index propriu, deci optimizatorul poate alege
+    # legitim un range scan urmat de sortarea rândurilor deja filtrate
+    orderings = [
+        '', 'created_date', '-created_date', 'like_count', '-like_count', 'views_count', '-views_count',
+        'unique_views', '-unique_views', 'price_per_m2', '-price_per_m2',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(
+            email='plan@example.com', password='parola-test', username='plan',
+            first_name='Test', last_name='Plan', phone_number='+40740000001'
+        )
+        county = County.objects.create(name='Cluj')
+        cities = [City.objects.create(name=f'Oras {i}', county=county) for i in range(10)]
+        categories = [Category.objects.create(name=f'Categorie {i}') for i in range(10)]
+
+        # Suficiente rânduri cât optimizatorul să nu prefere scanarea completă a unei tabele mici
+        today = now().date()
+        listings = [
+            Listing(
+                title=f'Anunt {i}', description='Descriere', price=10000 + i * 100, status=1,
+                user=user, county=county, city=cities[i % 10], category=categories[i // 10 % 10],
+                photo1='listings/test.webp', slug=f'anunt-{i}', suprafata_utila=30 + i % 100,
+                like_count=i % 37, views_count=i % 101, unique_views=i % 89,
+                valability_end_date=today + timedelta(days=i % 90),
+            )
+            for i in range(2000)
+        ]
+        for listing in listings:
+            listing.price_per_m2 = listing.compute_price_per_m2()  # bulk_create nu apelează save()
+        Listing.objects.bulk_create(listings)
+        rebuild_listing_search_documents()
+
+        with connection.cursor() as cursor:
+            if connection.vendor == 'mysql':
+                cursor.execute(f'ANALYZE TABLE {ListingSearchDocument._meta.db_table}')
+            elif connection.vendor == 'sqlite':
+                cursor.execute('ANALYZE')
+
+        cls.data = {'category': categories[3], 'city': cities[7]}
+
+    def setUp(self):
+        cache.clear()
+
+    def get_plan_problems(self, queryset):
+        if connection.vendor == 'mysql':
+            plan = json.loads(queryset.explain(format='json'))
+            problems = []
+
+            def walk(node):
+                if isinstance(node, dict):
+                    if node.get('access_type') == 'ALL':
+                        problems.append(f"full table scan pe {node.get('table_name')}")
+                    if node.get('using_filesort'):
+                        problems.append('filesort')
+                    for value in node.values():
+                        walk(value)
+                elif isinstance(node, list):
+                    for value in node:
+                        walk(value)
+
+            walk(plan)
+            return problems
+
+        if connection.vendor == 'sqlite':
+            plan = queryset.explain()
+            problems = []
+            for table in re.findall(r'\bSCAN (\w+)(?!\w| USING (?:COVERING )?INDEX)', plan):
+                problems.append(f'full table scan pe {table}')
+            if 'USE TEMP B-TREE FOR ORDER BY' in plan:
+                problems.append('filesort')
+            return problems
+
+        self.skipTest(f'EXPLAIN nu este verificat pentru {connection.vendor}.')
+
+    def test_every_filter_and_ordering_combination_uses_an_index(self):
+        view = ListingAPIView()
+        failures = []
+
+        for size in range(len(self.filter_params) + 1):
+            for names in itertools.combinations(self.filter_params, size):
+                for ordering in self.orderings:
+                    parts = []
+                    for name in names:
+                        value = self.filter_params[name](self.data)
+                        parts.append(value if '=' in value else f'{name}={value}')
+                    if ordering:
+                        parts.append(f'ordering={ordering}')
+                    query_string = '&'.join(parts)
+
+                    queryset = view.get_queryset(QueryDict(query_string))[:20]
+                    problems = self.get_plan_problems(queryset)
+                    if problems:
+                        failures.append(f"?{query_string}: {', '.join(problems)}")
+
+        self.assertEqual(failures, [], '\n'.join(failures))
+
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ListingDetailQueryCountTests(TestCase):
+    """Detaliul unui anunț (nomenclatoare, tag-uri, utilizator cu abonament) se încarcă în 2 interogări."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(
+            email='detail@example.com', password='parola-test', username='detail',
+            first_name='Test', last_name='Detail', phone_number='+40740000002'
+        )
+        UserSubscription.objects.create(user=user, user_type=UserType.objects.create(type_name='gold'))
+        county = County.objects.create(name='Cluj')
+        city = City.objects.create(name='Cluj-Napoca', county=county)
+        # bulk_create nu apelează save(), deci nici generarea thumbnail-ului
+        listing, = Listing.objects.bulk_create([Listing(
+            title='Apartament', description='Descriere', price=100000, status=1, user=user,
+            county=county, city=city, neighborhood=Neighborhood.objects.create(name='Zorilor', city=city),
+            category=Category.objects.create(name='Apartamente'), photo1='listings/test.webp',
+            slug='apartament-detail', valability_end_date=now().date() + timedelta(days=30),
+        )])
+        listing.tag.add(Tag.objects.create(name='Parcare'), Tag.objects.create(name='Centrală'))
+        cls.url = f'/api/listings/{listing.slug}/'
+
+    def setUp(self):
+        cache.clear()
+
+    def test_detail_uses_two_queries(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(VIEW_COUNTS_LOG=f'{directory}/listing_views.log'):
+            self.client.get(self.url)  # Versiunile tabelelor (ETag) ajung în cache
+            with self.assertNumQueries(2):
+                response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['tag']), 2)
+        self.assertEqual(response.json()['user']['user_type'], 'gold')
+
+class SavedSearchCreateTests(TestCase):
+    """Id-urile de nomenclator din parametri sunt verificate înainte de salvare (categoria și orașul devin chei străine)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='saved@example.com', password='parola-test', username='saved',
+            first_name='Test', last_name='Saved', phone_number='+40740000003'
+        )
+        cls.category = Category.objects.create(name='Apartamente')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_unknown_ids_are_rejected(self):
+        for name in ('category', 'county', 'city', 'neighborhood'):
+            response = self.client.post('/api/saved-searches/', {'params': {name: 99999}}, format='json')
+            self.assertEqual(response.status_code, 400, name)
+            self.assertIn(name, response.json()['params'])
+        self.assertFalse(SavedSearch.objects.exists())
+
+    def test_known_ids_are_saved(self):
+        response = self.client.post(
+            '/api/saved-searches/', {'params': {'category': self.category.pk, 'price_max': 90000}}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(SavedSearch.objects.get().category, self.category)
+
+class HyperLogLogTests(SimpleTestCase):
+    def make_sketch(self, items):
+        sketch = HyperLogLog()
+        for item in items:
+            sketch.add_hash(int.from_bytes(hashlib.blake2b(str(item).encode(), digest_size=8).digest(), 'big'))
+        return sketch
+
+    def test_estimate_is_within_error_bounds(self):
+        for cardinality in (10, 1000, 50000):
+            estimate = self.make_sketch(range(cardinality)).count()
+            self.assertLess(abs(estimate - cardinality), max(2, cardinality * 0.05), cardinality)
+
+    def test_duplicates_are_not_counted(self):
+        self.assertEqual(self.make_sketch([1, 2, 3] * 100).count(), 3)
+
+    def test_merge_counts_the_union_and_survives_serialization(self):
+        monday = HyperLogLog.from_bytes(self.make_sketch(range(0, 6000)).to_bytes())
+        tuesday = self.make_sketch(range(4000, 10000))
+        self.assertLess(abs(monday.merge(tuesday).count() - 10000), 500)
+
+
+class TwoTierCacheTests(SimpleTestCase):
+    """Două instanțe cu niveluri locale separate (ca două procese) peste același SQLiteCache."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(CACHES={'shared': {
+            'BACKEND': 'api.cache_backends.SQLiteCache', 'LOCATION': f'{directory.name}/cache.sqlite3',
+        }})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.shared = caches['shared']
+        # Nivelul local este ales după LOCATION: fiecare test și fiecare „proces” are propriul LRU
+        self.first = self.make_tier('first')
+        self.second = self.make_tier('second')
+
+    def make_tier(self, name, **options):
+        options = {'SYNC_INTERVAL': 0, **options}
+        return TwoTierCache(f'{self.id()}:{name}', {'OPTIONS': options})
+
+    def test_local_hit_and_miss(self):
+        self.assertIsNone(self.first.get('listing'))
+        self.first.set('listing', 1)
+        # Scris direct în nivelul partajat, fără jurnal: nivelul local răspunde cu valoarea lui
+        self.shared.set('listing', 2)
+        self.assertEqual(self.first.get('listing'), 1)
+        # Celălalt proces nu are cheia local, deci o citește din nivelul partajat
+        self.assertEqual(self.second.get('listing'), 2)
+        self.assertEqual(self.second.get_many(['listing', 'missing']), {'listing': 2})
+
+    def test_invalidation_reaches_the_other_instance_through_the_log(self):
+        self.first.set('listing', 1)
+        self.assertEqual(self.second.get('listing'), 1)  # Acum și în nivelul local al celui de-al doilea
+        self.first.set('listing', 2)
+        self.assertEqual(self.second.get('listing'), 2)
+        self.first.set_many({'listing': 3, 'category': 4})
+        self.assertEqual(self.second.get_many(['listing', 'category']), {'listing': 3, 'category': 4})
+        self.first.delete('listing')
+        self.assertIsNone(self.second.get('listing'))
+
+    def test_clear_and_log_gap_flush_the_local_tier(self):
+        self.first.set('listing', 1)
+        self.assertEqual(self.second.get('listing'), 1)
+
+        # clear(): generația dispare odată cu restul cheilor
+        self.first.clear()
+        self.shared.set('listing', 2)
+        self.assertEqual(self.second.get('listing'), 2)
+
+        # Intrare lipsă în jurnal: nu se știe ce s-a modificat, deci tot nivelul local este golit
+        self.first.set('category', 1)
+        self.second.get('category')
+        self.shared.set('listing', 3)
+        self.first.set('category', 2)
+        generation = self.shared.get(TwoTierCache.generation_key)
+        self.shared.delete(f'{TwoTierCache.log_key_prefix}:{generation}')
+        self.assertEqual(self.second.get('listing'), 3)
+
+        # Prea multe generații în urmă față de LOG_SIZE
+        lagging = self.make_tier('lagging', LOG_SIZE=2)
+        self.assertEqual(lagging.get('listing'), 3)
+        self.shared.set('listing', 4)
+        for value in range(3):
+            self.first.set('category', value)
+        self.assertEqual(lagging.get('listing'), 4)
+
+    def test_add_and_incr_are_atomic_on_the_shared_tier(self):
+        self.shared.add('counter', 0)
+        added = []
+
+        def work():
+            added.append(self.shared.add('winner', threading.get_ident()))
+            for _ in range(50):
+                self.shared.incr('counter')
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.shared.get('counter'), 400)
+        self.assertEqual(added.count(True), 1)
 
-# Create your tests here.
@@ -29,6 +29,8 @@ urlpatterns = [
     path('user-update/', UserUpdateAPIView.as_view(), name='user-update'),  
     path('tags/', TagListView.as_view(), name='tag-list'),             
     path('listings/', ListingAPIView.as_view(), name='listing-list'),
+    path('listings/map/', ListingMapAPIView.as_view(), name='listing-map'),
+    path('listings/facets/', ListingFacetsAPIView.as_view(), name='listing-facets'),
     path('listings/home/', HomeListingAPIView.as_view(), name='home-listings'),     
     path('promote-listing/', PromoteListingView.as_view(), name='promote-listing'),  
     path('confirm-payment/', ConfirmPaymentView.as_view(), name='confirm-payment'),       
@@ -41,9 +43,12 @@ urlpatterns = [
     path('listings/<uuid:uuid>/similar/', SimilarListingsAPIView.as_view(), name='listing-similar'),     
     path('listings/<uuid:uuid>/toggle-like/', ToggleLikeAPIView.as_view(), name='toggle_like'), 
     path('reports/<uuid:uuid>/', ReportCreateAPIView.as_view(), name='report-create'), # Ruta pentru a crea un raport
+    path('saved-searches/', SavedSearchListCreateAPIView.as_view(), name='saved-search-list'),
+    path('saved-searches/<int:pk>/', SavedSearchDetailAPIView.as_view(), name='saved-search-detail'),
     path('suggestions/', SuggestionCreateAPIView.as_view(), name='create-suggestion'),   
     path('privacy-policy/', PrivacyPolicySectionAPIView.as_view(), name='privacy-policy'),
     path('privacy-policy-history/', PrivacyPolicyHistoryAPIView.as_view(), name='privacy-policy-history'),    
     path('terms-policy/', TermsPolicySectionAPIView.as_view(), name='terms-policy'),
-    path('terms-policy-history/', TermsPolicyHistoryAPIView.as_view(), name='terms-policy-history'),        
+    path('terms-policy-history/', TermsPolicyHistoryAPIView.as_view(), name='terms-policy-history'),
+    path('cache-stats/', CacheStatsAPIView.as_view(), name='cache-stats'),        
 ]
\ No newline at end of file
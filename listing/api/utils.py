@@ -6,10 +6,53 @@ from django.template.loader import get_template
 import hashlib
 
 # for similar listings
+from django.db import transaction
 from django.db.models import Q
 from django.db.models.functions import Abs
 from django.db.models import F
-from .models import Listing
+from .models import Listing, ListingSearchDocument, ListingSearchTerm, SavedSearch, SavedSearchMatch, Category, Neighborhood
+from .models import Like, ListingDailyVisitors, ListingVisitors
+from .hyperloglog import HyperLogLog
+
+# for full-text search
+import html
+from datetime import date, timedelta
+from uuid import UUID
+import math
+import re
+import unicodedata
+from collections import Counter
+from django.core.cache import cache
+from django.db.models import Case, Count, FloatField, OuterRef, Subquery, Sum, Value, When
+
+# for geo search and map tiles
+from django.conf import settings
+from django.db.models import Avg, Min
+from django.db.models.functions import ASin, Cast, Cos, Floor, Power, Radians, Sin, Sqrt
+from django.utils.timezone import now
+
+# for random sample pools
+import random
+
+# for materialized blobs (home feed)
+import fcntl
+import logging
+import os
+import tempfile
+import time
+from urllib.parse import urljoin
+
+# for serializer-driven query planning
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.exceptions import APIException
+
+# for tag-based response cache invalidation
+from .caching import invalidate_tags, listing_cache_tags, table_validators
+from .cache_stats import record, record_fill, record_hit
+
+logger = logging.getLogger(__name__)
 
 def send_confirmation_email(email, token_id, user_id):
     data = {
@@ -24,7 +67,11 @@ def send_confirmation_email(email, token_id, user_id):
               fail_silently= True)
     print("Email-ul de confirmarea  fost trimis catre " + email)
     
-def get_similar_listings(listing_id):
+def get_similar_listings(listing_id, queryset=None):
+    # queryset permite apelantului să aplice select_related/only (vezi optimize_for_serializer)
+    if queryset is None:
+        queryset = Listing.objects.all()
+
     try:
         # Preia anunțul original
         listing = Listing.objects.get(id=listing_id)
@@ -32,12 +79,12 @@ def get_similar_listings(listing_id):
         return None
 
     # Filtre de bază
-    filters = Q(is_active_by_user=True) & Q(status=1) & Q(city=listing.city) & Q(category=listing.category)
+    filters = Q(is_active_by_user=True) & Q(status=1) & Q(city_id=listing.city_id) & Q(category_id=listing.category_id)
 
     # Include neighborhood dacă există
     primary_filters = filters
-    if listing.neighborhood:
-        primary_filters &= Q(neighborhood=listing.neighborhood)
+    if listing.neighborhood_id:
+        primary_filters &= Q(neighborhood_id=listing.neighborhood_id)
 
     # Caută anunțuri care respectă toate condițiile, inclusiv neighborhood
     # Nu tine cont de scorul combinat
@@ -54,7 +101,7 @@ def get_similar_listings(listing_id):
     
     # Caută anunțuri care respectă toate condițiile, inclusiv neighborhood
     similar_listings = list(
-    Listing.objects.filter(primary_filters)
+    queryset.filter(primary_filters)
     .annotate(
         price_diff=Abs(listing.price - F('price')),
         surface_diff=Abs(listing.suprafata_utila - F('suprafata_utila')),
@@ -73,7 +120,7 @@ def get_similar_listings(listing_id):
         
         fallback_filters = filters  # Ignoră neighborhood
         fallback_listings = (
-            Listing.objects.filter(fallback_filters)
+            queryset.filter(fallback_filters)
             .exclude(id__in=included_ids)  # Exclude anunțurile deja incluse
             .annotate(
                 price_diff=Abs(listing.price - F('price')),
@@ -89,7 +136,281 @@ def get_similar_listings(listing_id):
 
     return similar_listings
 
-    
+
+# Planificare interogări pe baza serializerului (select_related / prefetch_related / only)
+DISPLAY_METHOD_RE = re.compile(r'^get_(\w+)_display$')
+
+
+class SerializerQueryPlan:
+    """
+    Relațiile și coloanele citite de un serializer, relativ la modelul lui.
+    `only` este None când serializerul citește ceva ce nu poate fi dedus (proprietăți, metode),
+    caz în care nu restrângem coloanele.
+    """
+
+    def __init__(self):
+        self.select_related = set()
+        self.prefetch_related = {}
+        self.only = set()
+
+    def disable_only(self):
+        self.only = None
+
+    def add_only(self, path):
+        if self.only is not None:
+            self.only.add(path)
+
+
+def resolve_source_path(model, path, plan, prefix=''):
+    """
+    Parcurge un `source` de forma `a.b.c` pe model și înregistrează în plan join-urile și coloanele.
+    Returnează (modelul final, prefixul ORM) sau None dacă drumul trece printr-o relație multiplă
+    ori printr-un atribut care nu este câmp.
+    """
+    parts = path.split('.')
+    for index, part in enumerate(parts):
+        display = DISPLAY_METHOD_RE.match(part)
+        if display:
+            part = display.group(1)  # get_floor_display -> floor
+
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            if part in ('pk', model._meta.pk.name):
+                return model, prefix
+            plan.disable_only()  # Proprietate sau metodă: nu știm ce coloane folosește
+            return None
+
+        if not field.is_relation:
+            plan.add_only(prefix + field.name)
+            return model, prefix
+
+        if field.many_to_many or field.one_to_many:
+            plan.disable_only()  # Relațiile multiple citite direct se rezolvă doar prin serializere imbricate
+            return None
+
+        if index == len(parts) - 1:
+            # Câmp relațional citit ca valoare (ex. PrimaryKeyRelatedField): ajunge coloana FK
+            if field.concrete:
+                plan.add_only(prefix + field.name)
+            else:
+                plan.select_related.add(prefix + field.name)
+            return field.related_model, prefix + field.name + '__'
+
+        plan.select_related.add(prefix + field.name)
+        model, prefix = field.related_model, prefix + field.name + '__'
+    return model, prefix
+
+
+def plan_serializer(model, serializer_class, plan, prefix='', annotations=()):
+    """
+    Adaugă în plan tot ce citește serializerul, recursiv pentru serializerele imbricate.
+    """
+    serializer = serializer_class()
+    extra_sources = getattr(getattr(serializer_class, 'Meta', None), 'extra_sources', {})
+
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+
+        if isinstance(field, serializers.SerializerMethodField):
+            if name in extra_sources:
+                for path in extra_sources[name]:
+                    resolve_source_path(model, path, plan, prefix)
+            elif not prefix and name in annotations:
+                continue
+            else:
+                # Convenția din proiect: get_<câmp> citește de obicei câmpul cu același nume
+                try:
+                    model._meta.get_field(name)
+                except FieldDoesNotExist:
+                    plan.disable_only()
+                else:
+                    resolve_source_path(model, name, plan, prefix)
+            continue
+
+        if field.source == '*':
+            if isinstance(field, serializers.BaseSerializer):
+                plan_serializer(model, type(field), plan, prefix, annotations)
+            else:
+                plan.disable_only()
+            continue
+
+        if not prefix and field.source in annotations:
+            continue  # Valori calculate în interogare (annotate)
+
+        if isinstance(field, serializers.ListSerializer):
+            path = field.source.replace('.', '__')
+            try:
+                relation = model._meta.get_field(path)
+            except FieldDoesNotExist:
+                plan.disable_only()
+                continue
+            child_queryset = optimize_for_serializer(relation.related_model._default_manager.all(), type(field.child))
+            if relation.one_to_many and child_queryset.query.deferred_loading[0]:
+                # Django are nevoie de cheia străină către părinte pentru a grupa rezultatele
+                child_queryset = child_queryset.only(
+                    relation.remote_field.name, *child_queryset.query.deferred_loading[0]
+                )
+            plan.prefetch_related[prefix + path] = child_queryset
+            continue
+
+        resolved = resolve_source_path(model, field.source, plan, prefix)
+        if resolved and isinstance(field, serializers.BaseSerializer):
+            related_model, related_prefix = resolved
+            plan.select_related.add(related_prefix.rstrip('_'))
+            plan_serializer(related_model, type(field), plan, related_prefix)
+
+    return plan
+
+
+def optimize_for_serializer(queryset, serializer_class, extra_fields=()):
+    """
+    Aplică pe queryset select_related, prefetch_related și only() deduse din câmpurile
+    serializerului, astfel încât o pagină de rezultate să coste un număr constant de interogări.
+    `extra_fields` adaugă coloane folosite în afara serializerului (ex. câmpul de paginare).
+    """
+    plan = plan_serializer(
+        queryset.model, serializer_class, SerializerQueryPlan(),
+        annotations=set(queryset.query.annotations),
+    )
+
+    if plan.select_related:
+        queryset = queryset.select_related(*sorted(plan.select_related))
+    if plan.prefetch_related:
+        queryset = queryset.prefetch_related(*[
+            Prefetch(path, queryset=child_queryset)
+            for path, child_queryset in sorted(plan.prefetch_related.items())
+        ])
+    if plan.only is not None:
+        queryset = queryset.only(*sorted(plan.only | set(extra_fields)))
+    return queryset
+
+
+# Câmpurile de card care se schimbă fără updated_date (save cu update_fields); sunt citite la fiecare request
+CARD_LIVE_FIELDS = ('like_count',)
+
+# Câmpurile vânzătorului afișate pe card; editarea profilului nu schimbă updated_date-ul anunțurilor,
+# deci intră în cheia fragmentului
+CARD_SELLER_FIELDS = ('phone_number',)
+
+
+def card_queryset(queryset, extra_fields=()):
+    """Doar coloanele necesare pentru a găsi fragmentele de card din cache (vezi serialize_listing_cards)."""
+    return queryset.select_related('user').only(
+        'id', 'updated_date', *CARD_LIVE_FIELDS, *(f'user__{field}' for field in CARD_SELLER_FIELDS), *extra_fields
+    )
+
+
+def card_seller_validator(listing):
+    seller = '|'.join(str(getattr(listing.user, field)) for field in CARD_SELLER_FIELDS)
+    return hashlib.md5(seller.encode('utf-8')).hexdigest()[:8]
+
+
+def card_cache_variant(serializer_class, context):
+    """
+    Aceeași pereche anunț + updated_date poate produce carduri diferite: alt serializer (sau alte câmpuri),
+    URL-uri absolute pentru alt host sau nume de categorii/cartiere redenumite între timp.
+    """
+    request = (context or {}).get('request')
+    base_uri = request.build_absolute_uri('/') if request is not None else ''
+    taxonomy_etag, taxonomy_modified = table_validators(Category, Neighborhood)
+    fields = ','.join(serializer_class.Meta.fields)  # Fragmentele vechi nu sunt refolosite după schimbarea câmpurilor
+    variant = f'{serializer_class.__name__}:{fields}:{base_uri}:{taxonomy_etag}'
+    return hashlib.md5(variant.encode('utf-8')).hexdigest()[:12]
+
+
+def serialize_listing_cards(listings, serializer_class, context=None):
+    """
+    Cardurile anunțurilor, în ordinea primită, din fragmente pre-serializate aflate în cache sub
+    card:{variantă}:{pk}:{updated_date}:{vânzător}. Lipsurile sunt încărcate într-o singură interogare și
+    serializate împreună. `listings` are nevoie doar de coloanele din card_queryset.
+    """
+    listings = list(listings)
+    if not listings:
+        return []
+
+    variant = card_cache_variant(serializer_class, context)
+    keys = {
+        listing.pk: (
+            f'card:{variant}:{listing.pk}:{int(listing.updated_date.timestamp() * 1000000)}'
+            f':{card_seller_validator(listing)}'
+        )
+        for listing in listings
+    }
+    started = time.monotonic()
+    fragments = cache.get_many(list(keys.values()))
+
+    missing = [pk for pk, key in keys.items() if key not in fragments]
+    if len(missing) < len(keys):
+        record('card', hits=len(keys) - len(missing), hit_us=(time.monotonic() - started) * 1000000)
+    if missing:
+        started = time.monotonic()
+        instances = list(optimize_for_serializer(
+            serializer_class.Meta.model.objects.filter(pk__in=missing), serializer_class
+        ))
+        data = serializer_class(instances, many=True, context=context or {}).data
+        serialized = {keys[instance.pk]: dict(card) for instance, card in zip(instances, data)}
+        cache.set_many(serialized, settings.CACHES['default']['TIMEOUT'])
+        fragments.update(serialized)
+        record_fill('card', started, serialized, misses=len(missing))
+
+    cards = []
+    for listing in listings:
+        fragment = fragments.get(keys[listing.pk])
+        if fragment is None:
+            continue  # Șters între cele două interogări
+        card = dict(fragment)
+        for field in CARD_LIVE_FIELDS:
+            if field in card:
+                card[field] = getattr(listing, field)
+        cards.append(card)
+    return cards
+
+
+# Inima de pe card: id-urile anunțurilor apreciate de utilizator, păstrate în cache ca 16 bytes per anunț.
+# Cardurile (fragmente și răspunsuri din cache) sunt comune tuturor; is_liked este adăugat per request.
+LIKED_IDS_TIMEOUT = 60 * 60
+
+
+def liked_ids_key(user_id):
+    return f'liked_ids:{user_id}'
+
+
+def get_liked_listing_ids(user):
+    """Id-urile (str) anunțurilor apreciate de utilizator; la miss, o singură interogare pe Like."""
+    if not user.is_authenticated:
+        return set()
+    packed = cache.get(liked_ids_key(user.pk))
+    if packed is None:
+        listing_ids = Like.objects.filter(user=user).values_list('listing_id', flat=True)
+        packed = b''.join(sorted(listing_id.bytes for listing_id in listing_ids))
+        cache.set(liked_ids_key(user.pk), packed, LIKED_IDS_TIMEOUT)
+    return {str(UUID(bytes=packed[i:i + 16])) for i in range(0, len(packed), 16)}
+
+
+def update_liked_listing_ids(user, listing_id, liked):
+    """
+    Actualizează setul din cache după un toggle. Două toggle-uri simultane ale aceluiași utilizator pot
+    pierde o modificare; setul este oricum reconstruit din Like după LIKED_IDS_TIMEOUT.
+    """
+    packed = cache.get(liked_ids_key(user.pk))
+    if packed is None:
+        return  # Va fi construit din baza de date la prima listă
+    listing_ids = {packed[i:i + 16] for i in range(0, len(packed), 16)}
+    if liked:
+        listing_ids.add(UUID(str(listing_id)).bytes)
+    else:
+        listing_ids.discard(UUID(str(listing_id)).bytes)
+    cache.set(liked_ids_key(user.pk), b''.join(sorted(listing_ids)), LIKED_IDS_TIMEOUT)
+
+
+def annotate_liked(cards, user):
+    """Copii ale cardurilor cu is_liked; cardurile primite pot fi partajate prin cache, deci nu sunt modificate."""
+    liked_ids = get_liked_listing_ids(user)
+    return [{**card, 'is_liked': str(card.get('id')) in liked_ids} for card in cards]
+
+
 def generate_hash(image_file):
     """
     Generare hash pe baza conținutului fișierului.
@@ -106,3 +427,1020 @@ def generate_hash(image_file):
     return hash_value
 
 
+def is_listing_visible(listing):
+    """
+    Un anunț apare în listă doar dacă este aprobat și nu a fost dezactivat de utilizator.
+    Expirarea (valability_end_date) se verifică la interogare, deoarece depinde de zi.
+    """
+    return listing.status == 1 and listing.is_active_by_user
+
+
+# Căutare geografică: geohash pentru preselecție pe index, haversine pentru distanța exactă
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9  # ~5m, suficient pentru orice prefix folosit la căutare
+GEOHASH_MAX_CELLS = 24  # Numărul maxim de prefixe (condiții OR) pentru o zonă de căutare
+EARTH_RADIUS_KM = 6371.0
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """
+    Codifică o poziție în geohash. Returnează None dacă lipsește latitudinea sau longitudinea.
+    """
+    if latitude is None or longitude is None:
+        return None
+    latitude, longitude = float(latitude), float(longitude)
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, char_value, even = [], 0, 0, True
+
+    while len(chars) < precision:
+        # Biții alternează: longitudine, latitudine, longitudine...
+        target, value = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (target[0] + target[1]) / 2
+        char_value <<= 1
+        if value >= middle:
+            char_value |= 1
+            target[0] = middle
+        else:
+            target[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[char_value])
+            bits, char_value = 0, 0
+
+    return ''.join(chars)
+
+
+def geohash_cell_size(precision):
+    """Dimensiunea (lat, lng) în grade a unei celule geohash de lungime dată."""
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def geohash_prefixes_for_bbox(min_lat, min_lng, max_lat, max_lng):
+    """
+    Prefixele geohash care acoperă dreptunghiul, la cea mai mare precizie care nu depășește
+    GEOHASH_MAX_CELLS celule. Rezultatul este o supramulțime a zonei, verificată apoi exact.
+    """
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        cell_lat, cell_lng = geohash_cell_size(precision)
+        first_lat = math.floor((min_lat + 90) / cell_lat)
+        last_lat = math.floor((min(max_lat, 89.999999) + 90) / cell_lat)
+        first_lng = math.floor((min_lng + 180) / cell_lng)
+        last_lng = math.floor((min(max_lng, 179.999999) + 180) / cell_lng)
+        if (last_lat - first_lat + 1) * (last_lng - first_lng + 1) > GEOHASH_MAX_CELLS:
+            continue
+        return sorted({
+            # Codificăm centrul fiecărei celule din grilă
+            encode_geohash((row + 0.5) * cell_lat - 90, (column + 0.5) * cell_lng - 180, precision)
+            for row in range(first_lat, last_lat + 1)
+            for column in range(first_lng, last_lng + 1)
+        })
+    return []
+
+
+def bbox_around(latitude, longitude, radius_km):
+    """Dreptunghiul (min_lat, min_lng, max_lat, max_lng) care conține cercul dat."""
+    delta_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    delta_lng = math.degrees(radius_km / (EARTH_RADIUS_KM * max(math.cos(math.radians(latitude)), 1e-6)))
+    return (
+        max(latitude - delta_lat, -90.0), max(longitude - delta_lng, -180.0),
+        min(latitude + delta_lat, 90.0), min(longitude + delta_lng, 180.0),
+    )
+
+
+def filter_by_bbox(queryset, min_lat, min_lng, max_lat, max_lng):
+    """
+    Preselectează prin prefixele geohash (index) și păstrează doar pozițiile din dreptunghi.
+    """
+    prefixes = Q()
+    for prefix in geohash_prefixes_for_bbox(min_lat, min_lng, max_lat, max_lng):
+        prefixes |= Q(geohash__startswith=prefix)
+    return queryset.filter(prefixes).filter(
+        latitude__gte=min_lat, latitude__lte=max_lat,
+        longitude__gte=min_lng, longitude__lte=max_lng,
+    )
+
+
+def haversine_expression(latitude, longitude, lat_field='latitude', lng_field='longitude'):
+    """
+    Distanța în km (haversine) ca expresie SQL, calculată de baza de date pentru tot lotul
+    de candidați rămas după preselecția geohash.
+    """
+    lat1, lng1 = math.radians(latitude), math.radians(longitude)
+    lat2 = Radians(Cast(lat_field, FloatField()))
+    lng2 = Radians(Cast(lng_field, FloatField()))
+    a = (
+        Power(Sin((lat2 - Value(lat1)) / 2), 2)
+        + Value(math.cos(lat1)) * Cos(lat2) * Power(Sin((lng2 - Value(lng1)) / 2), 2)
+    )
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(a))
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Distanța în km între două puncte, calculată în Python."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (float(lat1), float(lng1), float(lat2), float(lng2)))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def filter_by_distance(queryset, latitude, longitude, radius_km):
+    """
+    Anunțurile aflate la cel mult radius_km de punct, cu adnotarea `distance_km`.
+    """
+    queryset = filter_by_bbox(queryset, *bbox_around(latitude, longitude, radius_km))
+    return queryset.annotate(
+        distance_km=haversine_expression(latitude, longitude)
+    ).filter(distance_km__lte=radius_km)
+
+
+# Hartă: tile-uri (schema slippy map, ca OpenStreetMap) calculate și cache-uite per zoom
+MAP_MAX_ZOOM = 20
+MAP_POINTS_ZOOM = 15  # De la acest zoom se trimit puncte individuale, nu clustere
+MAP_CLUSTER_GRID = 8  # Un tile este împărțit în 8x8 celule pentru clustere
+MAP_MAX_TILES = 64  # Numărul maxim de tile-uri dintr-o singură cerere
+MAP_MAX_LATITUDE = 85.05112878  # Limita proiecției Web Mercator
+
+
+def lat_lng_to_tile(latitude, longitude, zoom):
+    """Tile-ul (x, y) care conține poziția, la zoom-ul dat."""
+    latitude = max(min(float(latitude), MAP_MAX_LATITUDE), -MAP_MAX_LATITUDE)
+    n = 1 << zoom
+    x = int((float(longitude) + 180.0) / 360.0 * n)
+    lat_rad = math.radians(latitude)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bounds(x, y, zoom):
+    """Dreptunghiul (min_lat, min_lng, max_lat, max_lng) acoperit de un tile."""
+    n = 1 << zoom
+    min_lng = x / n * 360.0 - 180.0
+    max_lng = (x + 1) / n * 360.0 - 180.0
+    max_lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    min_lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return min_lat, min_lng, max_lat, max_lng
+
+
+def tiles_for_bbox(min_lat, min_lng, max_lat, max_lng, zoom):
+    """Toate tile-urile (x, y) care intersectează dreptunghiul."""
+    min_x, min_y = lat_lng_to_tile(max_lat, min_lng, zoom)
+    max_x, max_y = lat_lng_to_tile(min_lat, max_lng, zoom)
+    return [(x, y) for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1)]
+
+
+def map_tile_cache_key(zoom, x, y):
+    # Data face parte din cheie: anunțurile expirate dispar de pe hartă de la o zi la alta
+    return f'map_tile:{now().date().isoformat()}:{zoom}:{x}:{y}'
+
+
+def compute_map_tile(zoom, x, y):
+    """
+    Conținutul unui tile: puncte (id, lat, lng, preț) la zoom mare,
+    altfel clustere (număr, centroid, preț minim) pe o grilă de MAP_CLUSTER_GRID x MAP_CLUSTER_GRID.
+    """
+    min_lat, min_lng, max_lat, max_lng = tile_bounds(x, y, zoom)
+    queryset = filter_by_bbox(
+        ListingSearchDocument.objects.filter(valability_end_date__gte=now().date()),
+        min_lat, min_lng, max_lat, max_lng,
+    )
+    # Limitele de sus/dreapta aparțin tile-ului vecin, ca un anunț să nu apară de două ori
+    queryset = queryset.exclude(latitude=max_lat).exclude(longitude=max_lng)
+
+    if zoom >= MAP_POINTS_ZOOM:
+        return {'points': [
+            [str(pk), float(latitude), float(longitude), price]
+            for pk, latitude, longitude, price in queryset.values_list('pk', 'latitude', 'longitude', 'price')
+        ]}
+
+    cell_lat = (max_lat - min_lat) / MAP_CLUSTER_GRID
+    cell_lng = (max_lng - min_lng) / MAP_CLUSTER_GRID
+    rows = (
+        queryset.order_by()
+        .annotate(
+            cell_x=Floor((Cast('longitude', FloatField()) - Value(min_lng)) / Value(cell_lng)),
+            cell_y=Floor((Value(max_lat) - Cast('latitude', FloatField())) / Value(cell_lat)),
+        )
+        .values('cell_x', 'cell_y')
+        .annotate(
+            count=Count('pk'),
+            latitude=Avg(Cast('latitude', FloatField())),
+            longitude=Avg(Cast('longitude', FloatField())),
+            min_price=Min('price'),
+        )
+    )
+    return {'clusters': [
+        {
+            'count': row['count'],
+            'lat': round(row['latitude'], 6),
+            'lng': round(row['longitude'], 6),
+            'min_price': row['min_price'],
+        }
+        for row in rows
+    ]}
+
+
+def get_map_tile(zoom, x, y):
+    key = map_tile_cache_key(zoom, x, y)
+    started = time.monotonic()
+    tile = cache.get(key)
+    if tile is None:
+        tile = compute_map_tile(zoom, x, y)
+        cache.set(key, tile, settings.CACHES['default']['TIMEOUT'])
+        record_fill('map_tile', started, tile)
+    else:
+        record_hit('map_tile', started)
+    return tile
+
+
+def get_map_state(document):
+    """Ce influențează harta pentru un document: poziția, prețul și expirarea."""
+    if document is None or document.latitude is None or document.longitude is None:
+        return None
+    return (document.latitude, document.longitude, document.price, document.valability_end_date)
+
+
+def invalidate_map_tiles(*states):
+    """
+    Șterge din cache tile-urile (pentru toate zoom-urile) care conțin pozițiile date.
+    """
+    keys = set()
+    for state in states:
+        if state is None:
+            continue
+        latitude, longitude = state[0], state[1]
+        for zoom in range(MAP_MAX_ZOOM + 1):
+            keys.add(map_tile_cache_key(zoom, *lat_lng_to_tile(latitude, longitude, zoom)))
+    if keys:
+        cache.delete_many(keys)
+        record('map_tile', invalidations=len(keys))
+
+
+# Căutări salvate: parametrii din ListingFilter evaluați în Python pe documentele de căutare
+SAVED_SEARCH_IGNORED_PARAMS = {'ordering', 'radius_km'}
+
+
+def compile_saved_search(params, filterset_class):
+    """
+    Transformă parametrii unei căutări salvate într-o listă de condiții (funcții document, termeni -> bool).
+    Returnează None dacă parametrii nu mai sunt valizi pentru filterset.
+    """
+    filterset = filterset_class({name: str(value) for name, value in params.items()})
+    if not filterset.is_valid():
+        return None
+
+    cleaned_data = filterset.form.cleaned_data
+    predicates = []
+    for name, value in cleaned_data.items():
+        if value in (None, '') or name in SAVED_SEARCH_IGNORED_PARAMS:
+            continue
+        declared_filter = filterset.filters[name]
+
+        if name == 'q':
+            query_terms = set(analyze_search_text(value))
+            predicates.append(lambda document, terms, query_terms=query_terms: query_terms <= terms)
+        elif name == 'bbox':
+            try:
+                min_lat, min_lng, max_lat, max_lng = filterset.parse_coordinates(name, value, 4)
+            except APIException:
+                return None
+            predicates.append(
+                lambda document, terms, box=(min_lat, min_lng, max_lat, max_lng):
+                document.latitude is not None and document.longitude is not None
+                and box[0] <= document.latitude <= box[2] and box[1] <= document.longitude <= box[3]
+            )
+        elif name == 'near':
+            try:
+                latitude, longitude = filterset.parse_coordinates(name, value, 2)
+            except APIException:
+                return None
+            radius_km = float(cleaned_data.get('radius_km') or filterset.default_radius_km)
+            predicates.append(
+                lambda document, terms, point=(latitude, longitude), radius_km=radius_km:
+                document.latitude is not None and document.longitude is not None
+                and haversine_km(point[0], point[1], document.latitude, document.longitude) <= radius_km
+            )
+        elif declared_filter.method is None:
+            predicates.append(make_field_predicate(declared_filter.field_name, declared_filter.lookup_expr, value))
+        else:
+            return None  # Filtru cu metodă necunoscută: nu îl putem evalua în afara bazei de date
+
+    return predicates
+
+
+def make_field_predicate(field_name, lookup_expr, value):
+    """Condiția corespunzătoare unui filtru simplu (exact/gte/lte) din ListingFilter."""
+    def predicate(document, terms):
+        current = getattr(document, field_name)
+        if current is None:
+            return False
+        if lookup_expr == 'gte':
+            return current >= value
+        if lookup_expr == 'lte':
+            return current <= value
+        # ChoiceFilter întoarce șiruri de caractere, restul filtrelor valori tipizate
+        return str(current) == str(value) if isinstance(value, str) else current == value
+    return predicate
+
+
+def match_saved_searches(documents, filterset_class):
+    """
+    Potrivește un lot de documente de căutare cu toate căutările salvate active, într-o singură trecere.
+    Căutările sunt inversate într-un index după (categorie, oraș), deci pentru fiecare anunț
+    se evaluează doar căutările care pot să îi corespundă. Returnează numărul de potriviri noi
+    (cele deja înregistrate anterior nu sunt numărate).
+    """
+    documents = list(documents)
+    if not documents:
+        return 0
+
+    category_ids = {document.category_id for document in documents}
+    city_ids = {document.city_id for document in documents}
+    saved_searches = SavedSearch.objects.filter(
+        Q(category_id__in=category_ids) | Q(category__isnull=True),
+        Q(city_id__in=city_ids) | Q(city__isnull=True),
+        is_active=True,
+    ).only('pk', 'user_id', 'params', 'category_id', 'city_id')
+
+    index = {}
+    for saved_search in saved_searches:
+        predicates = compile_saved_search(saved_search.params, filterset_class)
+        if predicates is None:
+            continue
+        index.setdefault((saved_search.category_id, saved_search.city_id), []).append((saved_search, predicates))
+    if not index:
+        return 0
+
+    # Termenii pentru q, un singur query pentru tot lotul
+    terms_by_document = {}
+    for document_id, term in ListingSearchTerm.objects.filter(document__in=documents).values_list('document_id', 'term'):
+        terms_by_document.setdefault(document_id, set()).add(term)
+    owners = dict(Listing.objects.filter(pk__in=[document.pk for document in documents]).values_list('pk', 'user_id'))
+
+    existing = set(SavedSearchMatch.objects.filter(
+        listing_id__in=[document.pk for document in documents]
+    ).values_list('saved_search_id', 'listing_id'))
+
+    matches = []
+    for document in documents:
+        terms = terms_by_document.get(document.pk, set())
+        keys = {
+            (document.category_id, document.city_id), (document.category_id, None),
+            (None, document.city_id), (None, None),
+        }
+        for key in keys:
+            for saved_search, predicates in index.get(key, ()):
+                if saved_search.user_id == owners.get(document.pk):
+                    continue  # Nu trimitem alerte pentru propriile anunțuri
+                if (saved_search.pk, document.pk) in existing:
+                    continue
+                if all(predicate(document, terms) for predicate in predicates):
+                    matches.append(SavedSearchMatch(saved_search=saved_search, listing_id=document.pk))
+
+    # ignore_conflicts acoperă doar o rulare concurentă care a inserat aceeași pereche între timp
+    SavedSearchMatch.objects.bulk_create(matches, ignore_conflicts=True)
+    return len(matches)
+
+
+# Eșantionare aleatorie: în loc de ORDER BY RAND(), păstrăm în cache un pool de id-uri eligibile
+SAMPLE_POOL_SIZE = 1000  # Numărul maxim de id-uri păstrate per pool
+SAMPLE_POOL_TIMEOUT = 60 * 60  # Pool-urile sunt reîmprospătate cel puțin o dată pe oră
+SAMPLE_POOL_VERSION_KEY = 'sample_pool_version'
+
+
+def get_sample_pool_version():
+    version = cache.get(SAMPLE_POOL_VERSION_KEY)
+    if version is None:
+        version = 1
+        cache.add(SAMPLE_POOL_VERSION_KEY, version, None)
+    return version
+
+
+def invalidate_sample_pools():
+    """
+    Invalidează toate pool-urile deodată, prin schimbarea versiunii din cheie
+    (pool-urile vechi expiră singure).
+    """
+    try:
+        cache.incr(SAMPLE_POOL_VERSION_KEY)
+    except ValueError:
+        cache.set(SAMPLE_POOL_VERSION_KEY, 2, None)
+    record('sample_pool', invalidations=1)
+
+
+def sample_pool_key(scope):
+    # Data face parte din cheie: eligibilitatea depinde de valability_end_date
+    return f'sample_pool:{get_sample_pool_version()}:{now().date().isoformat()}:{scope}'
+
+
+def build_sample_pool(queryset):
+    """
+    Id-urile eligibile din queryset (doar cheia primară, fără sortare), cel mult SAMPLE_POOL_SIZE
+    alese uniform dintre toate.
+    """
+    ids = list(queryset.order_by().values_list('pk', flat=True))
+    if len(ids) > SAMPLE_POOL_SIZE:
+        ids = random.sample(ids, SAMPLE_POOL_SIZE)
+    return ids
+
+
+def get_sample_pool(scope, queryset):
+    key = sample_pool_key(scope)
+    started = time.monotonic()
+    pool = cache.get(key)
+    if pool is None:
+        pool = build_sample_pool(queryset)
+        cache.set(key, pool, SAMPLE_POOL_TIMEOUT)
+        record_fill('sample_pool', started, pool)
+    else:
+        record_hit('sample_pool', started)
+    return pool
+
+
+def sample_listings(scope, queryset, count):
+    """
+    Până la `count` anunțuri alese aleatoriu din pool-ul scope-ului: O(count) în memorie,
+    apoi o căutare după cheia primară. Id-urile devenite între timp neeligibile sunt ignorate.
+    """
+    pool = get_sample_pool(scope, queryset)
+    picked = random.sample(pool, min(count, len(pool)))
+    if not picked:
+        return []
+    listings = {listing.pk: listing for listing in queryset.filter(pk__in=picked)}
+    return [listings[pk] for pk in picked if pk in listings]
+
+
+def get_filter_scope(prefix, params, filterset_class):
+    """
+    Cheie canonică pentru un set de parametri de filtrare (ex. promoted, promoted:category=3&city=7).
+    Ordonarea și paginarea nu schimbă mulțimea eligibilă, deci sunt ignorate.
+    """
+    known = set(filterset_class.base_filters) - {'ordering'}
+    canonical = '&'.join(
+        f'{name}={value}'
+        for name in sorted(known)
+        for value in sorted(params.getlist(name))
+        if value != ''
+    )
+    if not canonical:
+        return prefix
+    return f'{prefix}:{hashlib.md5(canonical.encode("utf-8")).hexdigest()}'
+
+
+# Blob-uri materializate: răspunsuri pre-serializate scrise pe disc de un job, citite de view
+class AbsoluteURIBuilder:
+    """
+    Înlocuiește request-ul în contextul serializerelor când nu există unul (job-uri, comenzi),
+    ca ImageField și celelalte câmpuri să producă aceleași URL-uri absolute.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/') + '/'
+
+    def build_absolute_uri(self, location):
+        return urljoin(self.base_url, location)
+
+
+def materialize_blob(path, build, only_if_missing=False):
+    """
+    Construiește blob-ul (bytes) și îl scrie atomic (fișier temporar + os.replace), sub un lock,
+    astfel încât cititorii văd fie versiunea veche, fie pe cea nouă, iar un singur proces reconstruiește.
+    """
+    path = str(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f'{path}.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if only_if_missing and os.path.exists(path):
+            # Alt proces l-a construit cât am așteptat lock-ul
+            with open(path, 'rb') as blob:
+                return blob.read()
+
+        content = build()
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as temporary:
+                temporary.write(content)
+            os.replace(temporary_path, path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        return content
+
+
+def read_materialized_blob(path, build):
+    """
+    Citește blob-ul; doar dacă lipsește complet (ex. primul deploy) îl construiește, o singură dată.
+    Un blob vechi este servit așa cum este: reîmprospătarea este treaba job-ului periodic.
+    """
+    group = f'blob:{os.path.basename(str(path))}'
+    started = time.monotonic()
+    try:
+        with open(path, 'rb') as blob:
+            content = blob.read()
+    except FileNotFoundError:
+        content = materialize_blob(path, build, only_if_missing=True)
+        record_fill(group, started, content)
+        return content
+
+    record_hit(group, started)
+    return content
+
+
+def mark_blob_dirty(path):
+    """Marchează blob-ul pentru reconstruire la următoarea rulare a job-ului (debounce)."""
+    path = str(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f'{path}.dirty', 'a'):
+        pass
+    record(f'blob:{os.path.basename(path)}', invalidations=1)
+
+
+# Contorul de vizualizări: fiecare vizualizare este o linie adăugată (O_APPEND) într-un log local;
+# comanda flush_view_counts le adună și face câte un UPDATE cu F() per grup de anunțuri.
+# Linia conține și ziua și hash-ul vizitatorului, pentru vizitatorii unici (HyperLogLog).
+BOT_USER_AGENT_RE = re.compile(r'bot|crawl|spider|slurp|preview|headless|python-requests|curl|wget', re.IGNORECASE)
+
+
+def visitor_hash(request):
+    """
+    Identitatea vizitatorului ca hash pe 64 de biți (hex), cu cheie derivată din SECRET_KEY,
+    deci log-ul nu conține IP-uri. None pentru boți, care nu contează ca vizitatori unici.
+    """
+    user_agent = request.META.get('HTTP_USER_AGENT', '')
+    if not user_agent or BOT_USER_AGENT_RE.search(user_agent):
+        return None
+    if request.user.is_authenticated:
+        identity = f'user:{request.user.pk}'
+    else:
+        identity = f"{request.META.get(settings.VISITOR_IP_HEADER, '')}|{user_agent}"
+    key = hashlib.sha256(f'visitor:{settings.SECRET_KEY}'.encode()).digest()
+    return hashlib.blake2b(identity.encode(), key=key, digest_size=8).hexdigest()
+
+
+def record_listing_view(listing_id, visitor=None):
+    """Înregistrează o vizualizare fără a scrie în baza de date (fără save, deci fără semnale)."""
+    path = str(settings.VIEW_COUNTS_LOG)
+    line = f"{listing_id} {now().date().isoformat()} {visitor or '-'}\n".encode()
+    for attempt in range(3):
+        try:
+            descriptor = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            continue
+        try:
+            # Lock partajat: flush-ul ia lock exclusiv înainte să mute log-ul
+            fcntl.flock(descriptor, fcntl.LOCK_SH)
+            try:
+                if os.fstat(descriptor).st_ino != os.stat(path).st_ino:
+                    continue  # Log-ul a fost mutat pentru flush între open și lock
+            except FileNotFoundError:
+                continue
+            os.write(descriptor, line)
+            return
+        finally:
+            os.close(descriptor)
+
+
+def flush_listing_views():
+    """
+    Mută log-ul de vizualizări și adaugă contoarele în Listing și ListingSearchDocument prin update()
+    (fără semnale); vizitatorii sunt adăugați în sketch-urile zilnice, din care se recalculează unique_views.
+    Un log rămas de la un flush întrerupt (înainte de commit) este procesat primul.
+    Întoarce numărul de vizualizări și de anunțuri actualizate, sau None dacă alt flush rulează deja.
+    """
+    path = str(settings.VIEW_COUNTS_LOG)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Un singur flush odată: două rulări simultane ar aplica de două ori același log
+    with open(f'{path}.lock', 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        return flush_pending_views(path)
+
+
+def parse_view_log_line(line):
+    """(anunț, zi, hash vizitator sau None) dintr-o linie scrisă de record_listing_view; ValueError dacă e invalidă."""
+    parts = line.split()
+    if len(parts) == 1:
+        return str(UUID(parts[0])), None, None  # Formatul vechi: doar id-ul anunțului
+    if len(parts) != 3:
+        raise ValueError(line)
+    listing_id, day, visitor = parts
+    date.fromisoformat(day)
+    if visitor == '-':
+        return str(UUID(listing_id)), day, None
+    visitor = int(visitor, 16)
+    if visitor >= 1 << 64:
+        raise ValueError(line)
+    return str(UUID(listing_id)), day, visitor
+
+
+def flush_pending_views(path):
+    """Aplică log-ul mutat deoparte; apelată doar sub lock-ul din flush_listing_views."""
+    pending_path = f'{path}.flushing'
+    if not os.path.exists(pending_path):
+        try:
+            descriptor = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            return 0, 0
+        try:
+            fcntl.flock(descriptor, fcntl.LOCK_EX)  # Așteaptă scrierile în curs
+            os.replace(path, pending_path)
+        finally:
+            os.close(descriptor)
+
+    counts = Counter()
+    visitors = {}  # (anunț, zi) -> hash-urile vizitatorilor
+    skipped = 0
+    with open(pending_path, 'rb') as pending:
+        for line in pending.read().decode(errors='replace').splitlines():
+            if not line.strip():
+                continue
+            try:
+                listing_id, day, visitor = parse_view_log_line(line)
+            except ValueError:
+                # O linie coruptă (ex. scriere întreruptă) nu trebuie să blocheze tot lotul la fiecare rulare
+                skipped += 1
+                continue
+            counts[listing_id] += 1
+            if visitor is not None:
+                visitors.setdefault((listing_id, day), set()).add(visitor)
+    if skipped:
+        logger.warning('%s: %d linii invalide ignorate.', pending_path, skipped)
+
+    # Anunțurile cu același număr de vizualizări sunt actualizate împreună
+    by_increment = {}
+    for listing_id, increment in counts.items():
+        by_increment.setdefault(increment, []).append(listing_id)
+    with transaction.atomic():
+        for increment, listing_ids in by_increment.items():
+            Listing.objects.filter(pk__in=listing_ids).update(views_count=F('views_count') + increment)
+            ListingSearchDocument.objects.filter(listing_id__in=listing_ids).update(
+                views_count=F('views_count') + increment
+            )
+        if visitors:
+            add_daily_visitors(visitors)
+        # Log-ul dispare odată cu commit-ul: un lot aplicat nu mai poate fi reaplicat la următoarea rulare
+        transaction.on_commit(lambda: os.remove(pending_path))
+
+    invalidate_tags(*(f'listing:{listing_id}' for listing_id in counts))
+    return sum(counts.values()), len(counts)
+
+
+def add_daily_visitors(visitors):
+    """
+    Adaugă hash-urile vizitatorilor în sketch-urile (anunț, zi), folosite pentru intervale de zile, și în
+    sketch-ul cumulat al fiecărui anunț, din care se recalculează unique_views. Costul depinde doar de
+    numărul de anunțuri atinse, nu de câte zile de istoric au.
+    """
+    listing_ids = {
+        str(listing_id) for listing_id in
+        Listing.objects.filter(pk__in={listing_id for listing_id, day in visitors}).values_list('pk', flat=True)
+    }
+    visitors = {(listing_id, day): hashes for (listing_id, day), hashes in visitors.items() if listing_id in listing_ids}
+    if not visitors:
+        return
+
+    daily = ListingDailyVisitors.objects.select_for_update().filter(
+        listing_id__in=listing_ids, day__in={day for listing_id, day in visitors}
+    )
+    add_to_sketches(
+        ListingDailyVisitors, {(str(row.listing_id), row.day.isoformat()): row for row in daily}, visitors,
+        lambda key, data: ListingDailyVisitors(listing_id=key[0], day=key[1], sketch=data),
+    )
+
+    by_listing = {}
+    for (listing_id, day), hashes in visitors.items():
+        by_listing.setdefault(listing_id, set()).update(hashes)
+    totals = ListingVisitors.objects.select_for_update().filter(listing_id__in=by_listing)
+    sketches = add_to_sketches(
+        ListingVisitors, {str(row.listing_id): row for row in totals}, by_listing,
+        lambda listing_id, data: ListingVisitors(listing_id=listing_id, sketch=data),
+    )
+
+    Listing.objects.bulk_update(
+        [Listing(pk=listing_id, unique_views=sketch.count()) for listing_id, sketch in sketches.items()],
+        ['unique_views'],
+    )
+    ListingSearchDocument.objects.filter(listing_id__in=listing_ids).update(
+        unique_views=Subquery(Listing.objects.filter(pk=OuterRef('listing_id')).values('unique_views')[:1])
+    )
+
+
+def add_to_sketches(model, rows, hashes_by_key, new_row):
+    """Adaugă hash-urile în sketch-ul fiecărei chei (rândul existent sau unul nou); întoarce sketch-urile."""
+    created, updated, sketches = [], [], {}
+    for key, hashes in hashes_by_key.items():
+        row = rows.get(key)
+        sketch = HyperLogLog.from_bytes(row.sketch if row is not None else None)
+        for value in hashes:
+            sketch.add_hash(value)
+        sketches[key] = sketch
+        if row is None:
+            created.append(new_row(key, sketch.to_bytes()))
+        else:
+            row.sketch = sketch.to_bytes()
+            updated.append(row)
+    model.objects.bulk_create(created)
+    model.objects.bulk_update(updated, ['sketch'])
+    return sketches
+
+
+def delete_old_daily_visitors():
+    """Șterge sketch-urile zilnice mai vechi decât VISITOR_SKETCH_RETENTION_DAYS (cel cumulat rămâne)."""
+    cutoff = now().date() - timedelta(days=settings.VISITOR_SKETCH_RETENTION_DAYS)
+    deleted, _ = ListingDailyVisitors.objects.filter(day__lt=cutoff).delete()
+    return deleted
+
+
+def count_unique_visitors(listing_ids, since=None, until=None):
+    """
+    Vizitatorii unici estimați per anunț, din reuniunea sketch-urilor zilnice din interval (pentru
+    interogări ad-hoc; unique_views vine din sketch-ul cumulat). Zilele șterse de retenție nu mai contează.
+    """
+    days = ListingDailyVisitors.objects.filter(listing_id__in=listing_ids)
+    if since is not None:
+        days = days.filter(day__gte=since)
+    if until is not None:
+        days = days.filter(day__lte=until)
+
+    sketches = {}
+    for listing_id, data in days.values_list('listing_id', 'sketch').iterator():
+        sketch = HyperLogLog.from_bytes(data)
+        if listing_id in sketches:
+            sketches[listing_id].merge(sketch)
+        else:
+            sketches[listing_id] = sketch
+    return {listing_id: sketch.count() for listing_id, sketch in sketches.items()}
+
+
+def pop_blob_dirty(path):
+    """Returnează True dacă blob-ul era marcat pentru reconstruire și șterge marcajul."""
+    try:
+        os.remove(f'{path}.dirty')
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def build_search_document_values(listing):
+    """
+    Construiește valorile pentru rândul din ListingSearchDocument al unui anunț.
+    """
+    return {
+        'category_id': listing.category_id,
+        'county_id': listing.county_id,
+        'city_id': listing.city_id,
+        'neighborhood_id': listing.neighborhood_id,
+        'price': listing.price,
+        'suprafata_utila': listing.suprafata_utila,
+        'price_per_m2': listing.price_per_m2,
+        'year_of_construction': listing.year_of_construction,
+        'floor': listing.floor,
+        'is_promoted': listing.is_promoted,
+        'username_hash': listing.user.username_hash,
+        'valability_end_date': listing.valability_end_date,
+        'latitude': listing.latitude,
+        'longitude': listing.longitude,
+        'geohash': encode_geohash(listing.latitude, listing.longitude),
+        'created_date': listing.created_date,
+        'like_count': listing.like_count,
+        'views_count': listing.views_count,
+        'unique_views': listing.unique_views,
+        'title': listing.title,
+        'description': listing.description or '',
+        'negociabil': listing.negociabil,
+        'slug': listing.slug,
+        'thumbnail': listing.thumbnail.name if listing.thumbnail else None,
+        'numar_camere': listing.numar_camere,
+        'zonare': listing.zonare,
+        'buyer_commission': listing.buyer_commission,
+        'neighborhood_name': listing.neighborhood.name if listing.neighborhood else None,
+        'category_name': listing.category.name,
+        'phone_number': str(listing.user.phone_number) if listing.user.phone_number else None,
+    }
+
+
+# Contoarele se schimbă foarte des; în liste și în anunțurile similare le acceptăm ușor învechite
+# (până la expirarea intrării), deci invalidează doar răspunsurile anunțului însuși
+LISTING_ONLY_CACHE_FIELDS = {'like_count', 'views_count', 'unique_views'}
+
+
+def sync_listing_search_document(listing):
+    """
+    Sincronizează ListingSearchDocument cu starea curentă a anunțului:
+    creează/actualizează rândul dacă anunțul este vizibil, altfel îl șterge.
+    Indexul de termeni este refăcut doar când se schimbă titlul sau descrierea,
+    iar tile-urile de hartă doar când se schimbă poziția, prețul sau vizibilitatea.
+    """
+    document = ListingSearchDocument.objects.filter(listing_id=listing.pk).first()
+    old_map_state = get_map_state(document)
+    old_cache_tags = listing_cache_tags(document) if document is not None else []
+
+    if not is_listing_visible(listing):
+        if document is not None:
+            document.delete()
+            invalidate_map_tiles(old_map_state)
+            invalidate_tags(*old_cache_tags)
+        return None
+
+    values = build_search_document_values(listing)
+
+    if document is None:
+        document = ListingSearchDocument.objects.create(listing_id=listing.pk, **values)
+        text_changed = True
+        changed_fields = set(values)
+    else:
+        text_changed = (document.title, document.description) != (values['title'], values['description'])
+        changed_fields = {field for field, value in values.items() if getattr(document, field) != value}
+        for field, value in values.items():
+            setattr(document, field, value)
+        document.save()
+
+    if text_changed:
+        ListingSearchTerm.objects.filter(document=document).delete()
+        ListingSearchTerm.objects.bulk_create(build_search_terms(document))
+
+    new_map_state = get_map_state(document)
+    if new_map_state != old_map_state:
+        invalidate_map_tiles(old_map_state, new_map_state)
+
+    # Restul câmpurilor pot schimba listele, fațetele și anunțurile similare din grupurile vechi și noi
+    if changed_fields - LISTING_ONLY_CACHE_FIELDS:
+        invalidate_tags(*old_cache_tags, *listing_cache_tags(document))
+    else:
+        invalidate_tags(f'listing:{listing.pk}')
+
+    return document
+
+
+def rebuild_listing_search_documents(batch_size=500):
+    """
+    Reconstruiește complet ListingSearchDocument (și indexul de termeni) din tabela Listing.
+    Returnează numărul de rânduri create.
+    """
+    # Păstrăm momentul indexării, ca reconstruirea să nu pară o avalanșă de anunțuri noi pentru alerte
+    indexed_at = dict(ListingSearchDocument.objects.values_list('listing_id', 'indexed_at'))
+    ListingSearchDocument.objects.all().delete()
+
+    visible_listings = (
+        Listing.objects.filter(status=1, is_active_by_user=True)
+        .select_related('user', 'category', 'neighborhood')
+        .order_by('pk')
+    )
+
+    created = 0
+    batch = []
+
+    def flush(batch):
+        ListingSearchDocument.objects.bulk_create(batch)
+        ListingSearchTerm.objects.bulk_create(
+            [term for document in batch for term in build_search_terms(document)],
+            batch_size=batch_size,
+        )
+
+    for listing in visible_listings.iterator(chunk_size=batch_size):
+        batch.append(ListingSearchDocument(
+            listing_id=listing.pk,
+            indexed_at=indexed_at.get(listing.pk, listing.created_date),
+            **build_search_document_values(listing)
+        ))
+        if len(batch) >= batch_size:
+            flush(batch)
+            created += len(batch)
+            batch = []
+
+    if batch:
+        flush(batch)
+        created += len(batch)
+
+    return created
+
+
+# Căutare text: eliminarea diacriticelor și stemming ușor pentru limba română
+DIACRITICS_MAP = str.maketrans({
+    'ș': 's', 'ş': 's', 'Ș': 's', 'Ş': 's',
+    'ț': 't', 'ţ': 't', 'Ț': 't', 'Ţ': 't',
+    'ă': 'a', 'Ă': 'a', 'â': 'a', 'Â': 'a',
+    'î': 'i', 'Î': 'i',
+})
+
+SEARCH_STOPWORDS = {
+    'a', 'ai', 'al', 'ale', 'cu', 'de', 'din', 'dupa', 'e', 'este', 'fara', 'in', 'la', 'langa',
+    'mai', 'o', 'ori', 'pe', 'pentru', 'prin', 'sau', 'se', 'si', 'sunt', 'un', 'una', 'unei',
+    'unui', 'care', 'ce', 'cel', 'cea', 'cei', 'cele', 'foarte', 'spre', 'intr', 'intre',
+}
+
+# Sufixe flexionare (articol hotărât, plural, genitiv-dativ), de la cel mai lung la cel mai scurt
+ROMANIAN_SUFFIXES = (
+    'urilor', 'urile', 'ilor', 'elor', 'ului', 'iile', 'uri', 'ele', 'ile', 'lor',
+    'ul', 'ii', 'ei', 'le', 'ea', 'a', 'e', 'i', 'u',
+)
+
+SEARCH_TERM_MAX_LENGTH = 40
+SEARCH_TITLE_WEIGHT = 3
+SEARCH_MAX_QUERY_TERMS = 8
+
+
+def fold_diacritics(text):
+    """
+    Transformă textul în litere mici, fără diacritice (ș/ş -> s, ț/ţ -> t, ă/â -> a, î -> i).
+    """
+    text = text.translate(DIACRITICS_MAP).lower()
+    # Restul semnelor diacritice (ex. din alte limbi) sunt eliminate prin descompunere NFKD
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in text if not unicodedata.combining(char))
+
+
+def stem_romanian(token):
+    """
+    Stemming ușor: elimină un singur sufix flexionar, păstrând minim 3 litere.
+    """
+    if token.isdigit():
+        return token
+    for suffix in ROMANIAN_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    return token
+
+
+def analyze_search_text(text):
+    """
+    Împarte textul în termeni normalizați pentru indexul inversat.
+    """
+    if not text:
+        return []
+    text = html.unescape(re.sub(r'<[^>]+>', ' ', text))  # Descrierea poate conține tag-uri HTML
+    terms = []
+    for token in re.findall(r'[0-9a-z]+', fold_diacritics(text)):
+        if token in SEARCH_STOPWORDS or (len(token) < 2 and not token.isdigit()):
+            continue
+        terms.append(stem_romanian(token)[:SEARCH_TERM_MAX_LENGTH])
+    return terms
+
+
+def build_search_terms(document):
+    """
+    Construiește rândurile ListingSearchTerm pentru un document (fără să le salveze).
+    """
+    weights = Counter()
+    for term in analyze_search_text(document.title):
+        weights[term] += SEARCH_TITLE_WEIGHT
+    for term in analyze_search_text(document.description):
+        weights[term] += 1
+
+    return [
+        ListingSearchTerm(document_id=document.pk, term=term, weight=min(weight, 255))
+        for term, weight in weights.items()
+    ]
+
+
+def search_listing_documents(queryset, query):
+    """
+    Filtrează documentele care conțin toți termenii căutați și adaugă adnotarea
+    `relevance` (ponderea termenilor din titlu/descriere, înmulțită cu IDF).
+    """
+    terms = list(dict.fromkeys(analyze_search_text(query)))[:SEARCH_MAX_QUERY_TERMS]
+    if not terms:
+        return queryset
+
+    # Frecvența fiecărui termen în index, pentru IDF (citită din indexul pe `term`)
+    document_frequency = dict(
+        ListingSearchTerm.objects.filter(term__in=terms)
+        .values_list('term')
+        .annotate(df=Count('pk'))
+    )
+    if len(document_frequency) < len(terms):
+        return queryset.none()  # Un termen care nu apare nicăieri nu poate fi satisfăcut
+
+    total_documents = cache.get_or_set(
+        'listing_search_document_count', ListingSearchDocument.objects.count, 10 * 60
+    )
+    idf = {
+        term: math.log(1 + total_documents / df)
+        for term, df in document_frequency.items()
+    }
+
+    matching_documents = (
+        ListingSearchTerm.objects.filter(term__in=terms)
+        .values('document')
+        .annotate(matched=Count('term'))
+        .filter(matched=len(terms))
+        .values('document')
+    )
+    scores = (
+        ListingSearchTerm.objects.filter(document=OuterRef('pk'), term__in=terms)
+        .values('document')
+        .annotate(score=Sum(Case(
+            *[When(term=term, then=F('weight') * Value(idf[term])) for term in terms],
+            output_field=FloatField(),
+        )))
+        .values('score')
+    )
+
+    return queryset.filter(pk__in=matching_documents).annotate(
+        relevance=Subquery(scores, output_field=FloatField())
+    )
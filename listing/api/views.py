@@ -1,13 +1,23 @@
 from django.shortcuts import render
+from django.http import HttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
+from rest_framework.renderers import JSONRenderer
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework import status
 from django.conf import settings
 # send confirmation email after user sign up
-from .utils import send_confirmation_email, get_similar_listings
+from .utils import send_confirmation_email, get_similar_listings, search_listing_documents, optimize_for_serializer
+from .utils import sample_listings, get_filter_scope, card_queryset, serialize_listing_cards
+from .utils import AbsoluteURIBuilder, materialize_blob, read_materialized_blob, record_listing_view, visitor_hash
+from .utils import annotate_liked, update_liked_listing_ids
+from .utils import filter_by_bbox, filter_by_distance, tiles_for_bbox, get_map_tile, MAP_MAX_ZOOM, MAP_MAX_TILES, MAP_POINTS_ZOOM
+from .caching import cache_response, get_or_compute, scope_tags_for_params, category_city_tag, invalidate_tags
+from .caching import conditional_on_tables, conditional_response, table_validators, make_etag
+from .cache_stats import get_stats, reset_stats
 
 from django.contrib.auth import authenticate
+from django.contrib.auth.models import AnonymousUser
 from rest_framework.permissions import IsAuthenticated
 # for login
 from rest_framework_simplejwt.views import TokenObtainPairView
@@ -19,14 +29,19 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from django_filters import rest_framework as filters
 from django_filters import OrderingFilter
 from django_filters.rest_framework import DjangoFilterBackend
-from .constants import FLOOR_CHOICES
+from .constants import FLOOR_CHOICES, NUMAR_CAMERE_CHOICES, PRICE_FACET_BUCKETS
 
 # for pagination
-from rest_framework.pagination import PageNumberPagination
-
-# for caching
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from rest_framework.pagination import PageNumberPagination, BasePagination
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from django.utils.dateparse import parse_datetime
+from django.db.models import Q, Case, When, Value, IntegerField, Count
+from uuid import UUID
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+import json
+import math
+from decimal import Decimal
 
 # for listing
 # every user will be able to see all the listings, but only logged-in users will be able to add, change, or delete objects.
@@ -68,6 +83,7 @@ class APIRootView(APIView):
 class CategoryListAllAV(APIView):
     permission_classes = [AllowAny]
 
+    @conditional_on_tables(Category)
     def get(self, request):
         # Obține toate categoriile care nu sunt incluse ca subcategorii
         categories = Category.objects.filter(parent__isnull=True)
@@ -79,6 +95,7 @@ class CategoryListAllAV(APIView):
 class CategoryListAV(APIView):
     permission_classes = [AllowAny]
 
+    @conditional_on_tables(Category)
     def get(self, request):
         parent_categories = Category.objects.filter(parent__isnull=True)
         serializer = CategorySerializer(parent_categories, many=True)
@@ -99,6 +116,7 @@ class CategoryDetailAV(APIView):
 class CountyListAV(APIView):
     permission_classes = [AllowAny]
 
+    @conditional_on_tables(County)
     def get(self, request):
         counties = County.objects.all()
         serializer = CountySerializer(counties, many=True)
@@ -120,6 +138,7 @@ class CountyDetailAV(APIView):
 class CityListByCountyAV(APIView):
     permission_classes = [AllowAny]
 
+    @conditional_on_tables(County, City)
     def get(self, request, slug):
         try:
             # Găsește județul după slug
@@ -549,6 +568,128 @@ class ListingPagination(PageNumberPagination):
     page_size_query_param = 'page_size'
     max_page_size = 100
 
+class ListingCursorPagination(BasePagination):
+    """
+    Paginare keyset (cursor), activată opțional cu ?pagination=cursor.
+    Cursorul conține valoarea câmpului de ordonare și id-ul ultimului anunț,
+    deci nu rulează COUNT(*) și nici OFFSET, indiferent de adâncimea paginii.
+    """
+    page_size = settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    ordering_fields = ('created_date', 'like_count', 'views_count', 'unique_views', 'price_per_m2')
+    default_ordering = '-created_date'
+    invalid_cursor_message = 'Cursor invalid.'
+
+    @classmethod
+    def is_requested(cls, request):
+        params = request.query_params
+        return params.get(cls.mode_query_param) == 'cursor' or cls.cursor_query_param in params
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def get_ordering(self, request):
+        # Ordonarea activă (doar câmpurile permise), cu id-ul ca departajare
+        ordering = request.query_params.get('ordering') or self.default_ordering
+        if ordering.lstrip('-') not in self.ordering_fields:
+            ordering = self.default_ordering
+        return ordering.lstrip('-'), ordering.startswith('-')
+
+    def encode_cursor(self, obj, reverse):
+        value = getattr(obj, self.field)
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+        payload = json.dumps({'v': value, 'id': str(obj.pk), 'r': int(reverse)}, separators=(',', ':'))
+        return urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)).decode())
+            value, pk, reverse = payload['v'], UUID(str(payload['id'])), bool(payload['r'])
+            internal_type = self.model._meta.get_field(self.field).get_internal_type()
+            if internal_type == 'DateTimeField':
+                value = parse_datetime(value)
+                if value is None:
+                    raise ValueError
+            elif internal_type == 'DecimalField':
+                value = Decimal(value)
+            else:
+                value = int(value)
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError, ArithmeticError):
+            raise NotFound(self.invalid_cursor_message)
+        return value, pk, reverse
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.model = queryset.model
+        self.field, self.descending = self.get_ordering(request)
+        page_size = self.get_page_size(request)
+
+        # Rândurile fără valoare (ex. price_per_m2 fără suprafață) nu pot fi poziționate după cursor
+        if self.model._meta.get_field(self.field).null:
+            queryset = queryset.filter(**{f'{self.field}__isnull': False})
+
+        cursor = self.decode_cursor(request)
+        reverse = cursor[2] if cursor else False
+        # La navigarea înapoi parcurgem indexul în sens invers și inversăm rezultatul
+        descending = self.descending != reverse
+
+        if cursor:
+            value, pk, _ = cursor
+            if descending:
+                queryset = queryset.filter(Q(**{f'{self.field}__lt': value}) | Q(**{self.field: value, 'pk__lt': pk}))
+            else:
+                queryset = queryset.filter(Q(**{f'{self.field}__gt': value}) | Q(**{self.field: value, 'pk__gt': pk}))
+
+        prefix = '-' if descending else ''
+        results = list(queryset.order_by(f'{prefix}{self.field}', f'{prefix}pk')[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+
+        self.page = results
+        return results
+
+    def get_link(self, obj, reverse):
+        url = remove_query_param(self.request.build_absolute_uri(), 'page')
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(obj, reverse))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.get_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.get_link(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
 class ListingFilter(filters.FilterSet):
     price_min = filters.NumberFilter(field_name="price", lookup_expr="gte")
     price_max = filters.NumberFilter(field_name="price", lookup_expr="lte")
@@ -564,53 +705,150 @@ class ListingFilter(filters.FilterSet):
     # Filtre pentru suprafață utilă
     suprafata_utila_min = filters.NumberFilter(field_name="suprafata_utila", lookup_expr="gte", label="Suprafață utilă minimă")
     suprafata_utila_max = filters.NumberFilter(field_name="suprafata_utila", lookup_expr="lte", label="Suprafață utilă maximă")      
+
+    # Filtre pentru prețul pe m²
+    price_per_m2_min = filters.NumberFilter(field_name="price_per_m2", lookup_expr="gte", label="Preț minim pe m²")
+    price_per_m2_max = filters.NumberFilter(field_name="price_per_m2", lookup_expr="lte", label="Preț maxim pe m²")
     
     # Filtrul pentru etaj
     floor = filters.ChoiceFilter(field_name="floor", choices=FLOOR_CHOICES)
     
     # Filtrul pentru ordonare    
     ordering = OrderingFilter(
-    fields=['created_date', 'like_count', 'views_count']
+    fields=['created_date', 'like_count', 'views_count', 'unique_views', 'price_per_m2']
 )
     class Meta:
         model = Listing
         fields = [
             'category', 'price_min', 'price_max', 'city', 'county', 'neighborhood',
             'year_of_construction_min', 'year_of_construction_max', 
-            'username_hash', 'suprafata_utila_min', 'suprafata_utila_max', 'floor', 'is_promoted'
+            'username_hash', 'suprafata_utila_min', 'suprafata_utila_max', 'floor', 'is_promoted',
+            'price_per_m2_min', 'price_per_m2_max',
         ]
 
+class ListingSearchFilter(ListingFilter):
+    """
+    Aceleași filtre ca ListingFilter, aplicate pe ListingSearchDocument.
+    """
+    username_hash = filters.CharFilter(field_name="username_hash", lookup_expr="exact")
+    q = filters.CharFilter(method='filter_q')  # Căutare text în titlu și descriere
+
+    # Căutare geografică: bbox=min_lat,min_lng,max_lat,max_lng sau near=lat,lng&radius_km=
+    bbox = filters.CharFilter(method='filter_bbox')
+    near = filters.CharFilter(method='filter_near')
+    radius_km = filters.NumberFilter(method='filter_radius_km', label='Rază (km)')
+    default_radius_km = 5
+    max_radius_km = 100
+
+    # Ordonarea este aplicată de ListingAPIView.get_queryset; aici doar validăm valoarea
+    ordering = filters.ChoiceFilter(
+        method='filter_ordering',
+        choices=[
+            (f'{prefix}{field}', f'{prefix}{field}')
+            for field in ('created_date', 'like_count', 'views_count', 'unique_views', 'price_per_m2')
+            for prefix in ('', '-')
+        ] + [('distance', 'distance')],
+    )
+
+    class Meta(ListingFilter.Meta):
+        model = ListingSearchDocument
+
+    def filter_q(self, queryset, name, value):
+        return search_listing_documents(queryset, value)
+
+    def parse_coordinates(self, name, value, count):
+        try:
+            coordinates = [float(part) for part in value.split(',')]
+        except ValueError:
+            coordinates = []
+        if len(coordinates) != count or not all(math.isfinite(part) for part in coordinates):
+            raise ParseError({name: f'Sunt necesare {count} coordonate separate prin virgulă.'})
+        for latitude in coordinates[0::2]:
+            if not -90 <= latitude <= 90:
+                raise ParseError({name: 'Latitudinea trebuie să fie între -90 și 90.'})
+        for longitude in coordinates[1::2]:
+            if not -180 <= longitude <= 180:
+                raise ParseError({name: 'Longitudinea trebuie să fie între -180 și 180.'})
+        return coordinates
+
+    def filter_bbox(self, queryset, name, value):
+        min_lat, min_lng, max_lat, max_lng = self.parse_coordinates(name, value, 4)
+        if min_lat > max_lat or min_lng > max_lng:
+            raise ParseError({name: 'Format: min_lat,min_lng,max_lat,max_lng.'})
+        return filter_by_bbox(queryset, min_lat, min_lng, max_lat, max_lng)
+
+    def filter_near(self, queryset, name, value):
+        latitude, longitude = self.parse_coordinates(name, value, 2)
+        radius_km = self.form.cleaned_data.get('radius_km') or self.default_radius_km
+        if not 0 < radius_km <= self.max_radius_km:
+            raise ParseError({'radius_km': f'Raza trebuie să fie între 0 și {self.max_radius_km} km.'})
+        return filter_by_distance(queryset, latitude, longitude, float(radius_km))
+
+    def filter_radius_km(self, queryset, name, value):
+        return queryset  # Folosit doar împreună cu near
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset
+
 class ListingAPIView(APIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
     filter_backends = [DjangoFilterBackend]
-    filterset_class = ListingFilter
+    filterset_class = ListingSearchFilter
     pagination_class = ListingPagination
+    cursor_pagination_class = ListingCursorPagination
 
-    def get(self, request):
-        # Filtrare de bază
-        queryset = Listing.objects.filter(
-            status=1,
-            valability_end_date__gte=now().date(),
-            is_active_by_user=True  # Exclude anunțurile inactive by user
+    ordering_fields = ('created_date', 'like_count', 'views_count', 'unique_views', 'price_per_m2')
+    default_ordering = '-created_date'
+
+    def get_queryset(self, params):
+        """
+        Construiește interogarea listei pe baza parametrilor din query string.
+        Folosită și de testele care verifică planurile de execuție (EXPLAIN).
+        """
+        # Filtrare de bază: ListingSearchDocument conține doar anunțurile active și neascunse de utilizator
+        queryset = ListingSearchDocument.objects.filter(
+            valability_end_date__gte=now().date()
         )
 
         # Aplicare filtre
-        filterset = self.filterset_class(request.GET, queryset=queryset)
+        filterset = self.filterset_class(params, queryset=queryset)
         if filterset.is_valid():
             queryset = filterset.qs  # Aplică filtrarea definită dacă este validă
 
-        # Aplicare ordonare
-        ordering = request.GET.get('ordering')  # Preia parametru 'ordering' din query string
-        if ordering:
-            queryset = queryset.order_by(ordering)  # Aplică criteriul de ordonare
+        # Doar coloanele afișate pe card, plus cele folosite de ordonare și de cursor
+        queryset = optimize_for_serializer(queryset, ListingSearchDocumentSerializer, extra_fields=self.ordering_fields)
+
+        # La căutare text fără ordonare explicită, rezultatele sunt ordonate după relevanță
+        if 'relevance' in queryset.query.annotations and not params.get('ordering'):
+            return queryset.order_by('-relevance', '-created_date', '-pk')
+
+        # Aplicare ordonare, cu id-ul ca departajare pentru o paginare stabilă
+        ordering = params.get('ordering') or self.default_ordering
+        if ordering == 'distance' and 'distance_km' in queryset.query.annotations:
+            return queryset.order_by('distance_km', 'pk')  # Doar împreună cu near=
+        if ordering.lstrip('-') not in self.ordering_fields:
+            ordering = self.default_ordering
+        if ordering.lstrip('-') == 'price_per_m2':
+            # Anunțurile fără suprafață utilă nu au preț pe m² și nu pot fi ordonate după el
+            queryset = queryset.filter(price_per_m2__isnull=False)
+        prefix = '-' if ordering.startswith('-') else ''
+        return queryset.order_by(ordering, f'{prefix}pk')
 
-        # Aplicare paginare
-        paginator = self.pagination_class()
+    def get(self, request):
+        queryset = self.get_queryset(request.GET)
+
+        # Aplicare paginare (cursor doar la cerere, altfel paginare clasică pe pagini)
+        if self.cursor_pagination_class.is_requested(request):
+            paginator = self.cursor_pagination_class()
+        else:
+            paginator = self.pagination_class()
         paginated_queryset = paginator.paginate_queryset(queryset, request)
 
-        # Serializare
-        serializer = ListingMinimalSerializer(paginated_queryset, context={'request': request}, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        # Serializare direct din document, fără fragmentele de card (serialize_listing_cards): rândul adus
+        # de paginare conține deja toate câmpurile cardului, fără join-uri, deci fragmentele ar adăuga doar
+        # un get_many; în plus distance_km (near=) și relevanța depind de request
+        serializer = ListingSearchDocumentSerializer(paginated_queryset, context={'request': request}, many=True)
+        return paginator.get_paginated_response(annotate_liked(serializer.data, request.user))
     
     def post(self, request):
             """
@@ -622,6 +860,147 @@ class ListingAPIView(APIView):
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST) 
 
+class ListingFacetsAPIView(APIView):
+    """
+    Numărul de rezultate pentru fiecare valoare de categorie, oraș, cartier, număr de camere,
+    etaj și interval de preț, pentru aceiași parametri ca lista de anunțuri; fiecare fațetă
+    ignoră propriul filtru (ex. cu category=3 se văd în continuare celelalte categorii).
+    """
+    permission_classes = [AllowAny]
+    filterset_class = ListingSearchFilter
+    facet_fields = ('category', 'city', 'neighborhood', 'numar_camere', 'floor', 'price_range')
+    cache_prefix = 'listing_facets'
+
+    # Parametrii care filtrează chiar fațeta: fiecare fațetă este numărată cu toate filtrele
+    # în afară de ale ei, ca după alegerea unei categorii să rămână vizibile și celelalte
+    facet_filters = {
+        'category': ('category',),
+        'city': ('city',),
+        'neighborhood': ('neighborhood',),
+        'numar_camere': (),
+        'floor': ('floor',),
+        'price_range': ('price_min', 'price_max'),
+    }
+    # Coloanele grupate pentru fiecare fațetă: (valoare, etichetă din document)
+    facet_columns = {
+        'category': ('category_id', 'category_name'),
+        'city': ('city_id', None),
+        'neighborhood': ('neighborhood_id', 'neighborhood_name'),
+        'numar_camere': ('numar_camere', None),
+        'floor': ('floor', None),
+        'price_range': ('price_range', None),
+    }
+
+    def get_facet_params(self, params, field):
+        facet_params = params.copy()
+        for name in self.facet_filters[field]:
+            facet_params.pop(name, None)
+        return facet_params
+
+    def get_cache_tags(self, params):
+        # Fațetele fără propriul filtru depind de grupuri mai largi decât lista filtrată
+        tags = set(scope_tags_for_params(params))
+        for field in self.facet_fields:
+            tags.update(scope_tags_for_params(self.get_facet_params(params, field)))
+        return tags
+
+    def get_cache_key(self, params):
+        # Data face parte din cheie pentru că filtrarea de bază depinde de valability_end_date
+        scope = get_filter_scope(self.cache_prefix, params, self.filterset_class)
+        return f'{scope}:{now().date().isoformat()}'
+
+    def get_price_bucket_expression(self):
+        whens = []
+        for bucket, lower, upper, label in PRICE_FACET_BUCKETS:
+            condition = Q()
+            if lower is not None:
+                condition &= Q(price__gte=lower)
+            if upper is not None:
+                condition &= Q(price__lt=upper)
+            whens.append(When(condition, then=Value(bucket)))
+        return Case(*whens, default=Value(None), output_field=IntegerField())
+
+    def compute_facets(self, params):
+        view = ListingAPIView()
+        total = view.get_queryset(params).order_by().count()
+
+        # O interogare grupată per fațetă: câte un rând per valoare, nu per combinație de valori
+        counts = {}
+        labels = {}
+        for field in self.facet_fields:
+            queryset = view.get_queryset(self.get_facet_params(params, field)).order_by()
+            if field == 'price_range':
+                queryset = queryset.annotate(price_range=self.get_price_bucket_expression())
+
+            value_column, label_column = self.facet_columns[field]
+            columns = [value_column] + ([label_column] if label_column else [])
+            counts[field], labels[field] = {}, {}
+            for row in queryset.values(*columns).annotate(count=Count('pk')):
+                value = row[value_column]
+                if value is None:
+                    continue
+                counts[field][value] = counts[field].get(value, 0) + row['count']
+                if label_column:
+                    labels[field][value] = row[label_column]
+
+        # Etichetele care nu sunt în document
+        labels['city'] = dict(City.objects.filter(pk__in=counts['city']).values_list('pk', 'name'))
+        labels['numar_camere'] = dict(NUMAR_CAMERE_CHOICES)
+        labels['floor'] = dict(FLOOR_CHOICES)
+        labels['price_range'] = {bucket: label for bucket, lower, upper, label in PRICE_FACET_BUCKETS}
+
+        facets = {}
+        for field in self.facet_fields:
+            facets[field] = [
+                {'value': value, 'label': labels[field].get(value), 'count': count}
+                for value, count in sorted(counts[field].items(), key=lambda item: (-item[1], item[0]))
+            ]
+        return {'count': total, 'facets': facets}
+
+    def get(self, request):
+        data = get_or_compute(
+            self.get_cache_key(request.GET), lambda: self.compute_facets(request.GET),
+            self.get_cache_tags(request.GET), CACHE_TIMEOUT,
+        )
+        return Response(data)
+
+class ListingMapAPIView(APIView):
+    """
+    Pini pentru hartă: pentru zona vizibilă (bbox) și zoom, întoarce clustere
+    (număr, centroid, preț minim) sau, la zoom mare, puncte [id, lat, lng, preț].
+    Fiecare tile este calculat și cache-uit separat, deci zonele care se suprapun se refolosesc.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        try:
+            min_lat, min_lng, max_lat, max_lng = [float(part) for part in request.GET.get('bbox', '').split(',')]
+            zoom = int(request.GET.get('zoom', ''))
+        except ValueError:
+            return Response(
+                {"detail": "Parametrii necesari: bbox=min_lat,min_lng,max_lat,max_lng și zoom."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if not 0 <= zoom <= MAP_MAX_ZOOM:
+            return Response({"detail": f"Zoom-ul trebuie să fie între 0 și {MAP_MAX_ZOOM}."}, status=status.HTTP_400_BAD_REQUEST)
+        if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lng <= max_lng <= 180):
+            return Response({"detail": "Zona (bbox) nu este validă."}, status=status.HTTP_400_BAD_REQUEST)
+
+        tiles = tiles_for_bbox(min_lat, min_lng, max_lat, max_lng, zoom)
+        if len(tiles) > MAP_MAX_TILES:
+            return Response({"detail": "Zona este prea mare pentru acest zoom."}, status=status.HTTP_400_BAD_REQUEST)
+
+        clusters, points = [], []
+        for x, y in tiles:
+            tile = get_map_tile(zoom, x, y)
+            clusters.extend(tile.get('clusters', []))
+            points.extend(tile.get('points', []))
+
+        if zoom >= MAP_POINTS_ZOOM:
+            return Response({'zoom': zoom, 'points': points})
+        return Response({'zoom': zoom, 'clusters': clusters})
+
 class promotedListingWidgetAPIView(APIView):
     permission_classes = [AllowAny]   
     filter_backends = [DjangoFilterBackend]
@@ -638,91 +1017,133 @@ class promotedListingWidgetAPIView(APIView):
         )
 
         # Aplicare filtre
+        scope = 'promoted'
         filterset = self.filterset_class(request.GET, queryset=queryset)
         if filterset.is_valid():
             queryset = filterset.qs  # Aplică filtrarea definită dacă este validă
+            scope = get_filter_scope(scope, request.GET, self.filterset_class)
             
-        # Selectarea aleatorie a 4 anunțuri promovate
-        promoted_listings = queryset.order_by('?')[:4]
+        # Selectarea aleatorie a 4 anunțuri promovate, din pool-ul de id-uri eligibile (fără ORDER BY RAND())
+        promoted_listings = sample_listings(scope, card_queryset(queryset), 4)
 
-        serializer = ListingMinimalSerializer(promoted_listings, context={'request': request}, many=True)
-        return Response(serializer.data)
+        # Cardurile vin din fragmentele pre-serializate; doar lipsurile sunt serializate
+        cards = serialize_listing_cards(promoted_listings, ListingMinimalSerializer, {'request': request})
+        return Response(annotate_liked(cards, request.user))
            
 class HomeListingAPIView(APIView):
+    """
+    Servește feed-ul de pe prima pagină dintr-un blob JSON pre-serializat, reconstruit
+    de comanda materialize_home_feed (la modificarea anunțurilor sau periodic).
+    """
     permission_classes = [AllowAny]    
-    
-    @method_decorator(cache_page(CACHE_TIMEOUT))
-    def get(self, request):
+    section_size = 8
+
+    @classmethod
+    def build_payload(cls, request):
+        # Toate secțiunile folosesc același card: se citesc doar id-urile, cardurile vin din fragmente
+        cards = card_queryset(Listing.objects.all())
+        size = cls.section_size
+
         # Obține cele 8 cele mai noi anunțuri
-        latest_listings = Listing.objects.filter(
+        latest_listings = cards.filter(
             status=1,
             valability_end_date__gte=now().date()
-        ).order_by('-created_date')[:8]
+        ).order_by('-created_date')[:size]
         
         # Obține cele 8 cele mai noi anunțuri promovate
-        promoted_listings = Listing.objects.filter(
+        promoted_listings = cards.filter(
             status=1,
             is_promoted=True,
             valability_end_date__gte=now().date()
-        ).order_by('-created_date')[:8]
+        ).order_by('-created_date')[:size]
                 
 
         # Obține cele 8 cele mai apreciate anunțuri
-        most_liked_listings = Listing.objects.filter(
+        most_liked_listings = cards.filter(
             status=1,
             valability_end_date__gte=now().date()
-        ).order_by('-like_count')[:8]
+        ).order_by('-like_count')[:size]
         
-        # Obține cele 8 cele mai vizualizate anunțuri
-        most_viewed_listings = Listing.objects.filter(
+        # Obține cele 8 cele mai vizualizate anunțuri (după vizitatori unici, nu după reîncărcări)
+        most_viewed_listings = cards.filter(
             status=1,
             valability_end_date__gte=now().date()
-        ).order_by('-views_count')[:8]        
+        ).order_by('-unique_views', '-views_count')[:size]        
 
         # Obține 8 anunțuri random
-        random_listings = Listing.objects.filter(
+        random_listings = sample_listings('home', cards.filter(
             status=1,
             valability_end_date__gte=now().date()
-        ).order_by('?')[:8]
+        ), size)
 
         # Serializăm datele
-        latest_serializer = ListingMinimalSerializer(latest_listings, context={'request': request}, many=True)
-        promoted_serializer = ListingMinimalSerializer(promoted_listings, context={'request': request}, many=True)        
-        liked_serializer = ListingMinimalSerializer(most_liked_listings, context={'request': request}, many=True)
-        most_viewed = ListingMinimalSerializer(most_viewed_listings, context={'request': request}, many=True)        
-        random_serializer = ListingMinimalSerializer(random_listings, context={'request': request}, many=True)
+        context = {'request': request}
+
+        # Returnăm datele într-un răspuns structurat (feed-ul este comun, deci fără like-urile cuiva)
+        sections = {
+            'latest': latest_listings,            # Cele mai noi anunțuri
+            'promoted': promoted_listings,        # Anunțuri promovate
+            'most_liked': most_liked_listings,    # Cele mai apreciate anunțuri
+            'most_viewed': most_viewed_listings,  # Cele mai vizualizate anunțuri
+            'random': random_listings,            # Anunțuri random
+        }
+        return {
+            section: annotate_liked(serialize_listing_cards(listings, ListingMinimalSerializer, context), AnonymousUser())
+            for section, listings in sections.items()
+        }
+
+    @classmethod
+    def render_feed(cls):
+        """Blob-ul JSON al feed-ului, cu URL-uri absolute construite din settings.API_URL."""
+        return JSONRenderer().render(cls.build_payload(AbsoluteURIBuilder(settings.API_URL)))
+
+    @classmethod
+    def materialize(cls):
+        return materialize_blob(settings.HOME_FEED_PATH, cls.render_feed)
 
-        # Returnăm datele într-un răspuns structurat
-        return Response({
-            'latest': latest_serializer.data,      # Cele mai noi anunțuri
-            'promoted': promoted_serializer.data,  # Anunțuri promovate
-            'most_liked': liked_serializer.data,   # Cele mai apreciate anunțuri
-            'most_viewed': most_viewed.data,       # Cele mai vizualizate anunțuri            
-            'random': random_serializer.data,      # Anunțuri random
-        }, status=status.HTTP_200_OK)
+    def get(self, request):
+        # Doar citire de pe disc: baza de date este atinsă numai dacă blob-ul lipsește (primul request
+        # după deploy pe un host nou); un feed vechi este servit până îl reconstruiește job-ul periodic
+        content = read_materialized_blob(settings.HOME_FEED_PATH, self.render_feed)
+        if request.user.is_authenticated:
+            # Blob-ul are is_liked=False; doar pentru utilizatorii autentificați este refăcut per request
+            feed = json.loads(content)
+            content = JSONRenderer().render({
+                section: annotate_liked(cards, request.user) for section, cards in feed.items()
+            })
+        return HttpResponse(content, content_type='application/json')
     
 # Clasă pentru vizualizare detaliată
 class ListingDetailAPIView(APIView):
     permission_classes = [AllowAny]  
+
+    # Tot graful folosit de ListingDetailSerializer: un JOIN pentru anunț, nomenclatoare și
+    # utilizator (cu abonament și tip) și o interogare pentru tag-uri, deci 2 interogări în total
+    queryset = Listing.objects.select_related(
+        'county', 'city', 'neighborhood', 'category', 'user__subscription__user_type',
+    ).prefetch_related('tag')
     
     def get(self, request, slug, *args, **kwargs):
         try:
-            listing = Listing.objects.get(slug=slug)
+            listing = self.queryset.get(slug=slug)
         except Listing.DoesNotExist:
             return Response(
                 {"detail": "Anunțul nu a fost găsit."},
                 status=status.HTTP_404_NOT_FOUND,
             )
 
+        # Comparație pe id-uri: fără să încarce request.user sau listing.user
+        is_owner = request.user.is_authenticated and listing.user_id == request.user.pk
+
         # Verifică dacă anunțul este activ sau dacă utilizatorul este proprietar
-        if listing.status != 1 and listing.user != request.user:
+        if listing.status != 1 and not is_owner:
             return Response(
                 {"detail": "Nu aveți permisiunea să accesați acest anunț."},
                 status=status.HTTP_403_FORBIDDEN,
             )
 
         # Verifică dacă anunțul este dezactivat de utilizator
-        if not listing.is_active_by_user and listing.user != request.user:
+        if not listing.is_active_by_user and not is_owner:
             return Response(
                 {"detail": "Nu aveți permisiunea să accesați acest anunț."},
                 status=status.HTTP_403_FORBIDDEN,
@@ -731,20 +1152,38 @@ class ListingDetailAPIView(APIView):
         # Verifică dacă anunțul a expirat
         if listing.valability_end_date and listing.valability_end_date < timezone.now().date():
             # Dacă utilizatorul nu este proprietarul, întoarce mesaj de expirare
-            if listing.user != request.user:
+            if not is_owner:
                 return Response(
                     {"detail": "Anunțul a expirat și nu este accesibil."},
                     status=status.HTTP_403_FORBIDDEN,
                 )
                 
-        # Incrementare views_count dacă utilizatorul nu este proprietarul
-        if listing.user != request.user:
-            listing.views_count += 1
-            listing.save(update_fields=['views_count'])  # Optimizează salvarea doar pentru acest câmp
-
-        # Serializare și răspuns
-        serializer = ListingDetailSerializer(listing, context={'request': request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        # Incrementare views_count dacă utilizatorul nu este proprietarul; vizualizarea este
+        # acumulată în log și scrisă periodic de flush_view_counts (fără save și fără semnale)
+        if not is_owner:
+            record_listing_view(listing.pk, visitor_hash(request))
+
+        # Răspunsul depinde de rândul anunțului, de numele din nomenclatoare și de datele vânzătorului
+        # (UserInfoSerializer), care nu schimbă updated_date; toate sunt deja încărcate prin select_related.
+        # Contoarele (views_count, like_count) pot fi ușor învechite într-un 304.
+        taxonomy_etag, _ = table_validators(County, City, Neighborhood, Category, Tag)
+        seller = listing.user
+        subscription = getattr(seller, 'subscription', None)  # RelatedObjectDoesNotExist este AttributeError
+        etag = make_etag(
+            'listing', listing.pk, listing.updated_date.isoformat(), taxonomy_etag,
+            listing.user_id, seller.first_name, seller.phone_number, seller.username_hash, seller.account_type,
+            seller.last_login.isoformat() if seller.last_login else None,
+            subscription.user_type_id if subscription is not None else None,
+        )
+        # Fără Last-Modified: o modificare a vânzătorului (ex. telefonul) nu are o dată proprie,
+        # iar un client care trimite doar If-Modified-Since ar primi 304 cu datele vechi
+
+        # Serializare și răspuns (doar dacă clientul nu are deja versiunea curentă)
+        def build():
+            serializer = ListingDetailSerializer(listing, context={'request': request})
+            return Response(serializer.data, status=status.HTTP_200_OK)
+
+        return conditional_response(request, build, etag)
     
     
 # Clasă pentru ștergere
@@ -796,18 +1235,81 @@ class ListingUpdateAPIView(APIView):
 class LikedListingsAPIView(APIView):
     permission_classes = [IsAuthenticated]
     pagination_class = ListingPagination
+    cursor_pagination_class = ListingCursorPagination
 
     def get(self, request):
         # Obține anunțurile pe care utilizatorul autentificat le-a likat
-        liked_listings = Listing.objects.filter(likes__user=request.user, status=1).distinct()
+        liked_listings = card_queryset(
+            Listing.objects.filter(likes__user=request.user, status=1).distinct(),
+            extra_fields=ListingCursorPagination.ordering_fields,
+        )
         
-        # Aplicare paginare directă
-        paginator = self.pagination_class()
+        # Aplicare paginare directă (cursor doar la cerere)
+        if self.cursor_pagination_class.is_requested(request):
+            paginator = self.cursor_pagination_class()
+        else:
+            paginator = self.pagination_class()
         paginated_queryset = paginator.paginate_queryset(liked_listings, request)
 
-        # Serializare
-        serializer = ListingMinimalSerializer(paginated_queryset, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        # Serializare (fragmentele de card din cache, doar lipsurile sunt serializate)
+        cards = serialize_listing_cards(paginated_queryset, ListingMinimalSerializer)
+        return paginator.get_paginated_response(annotate_liked(cards, request.user))
+
+class SavedSearchListCreateAPIView(APIView):
+    """
+    Căutările salvate ale utilizatorului autentificat (pentru alerte la anunțuri noi).
+    """
+    permission_classes = [IsAuthenticated]
+    filterset_class = ListingSearchFilter
+    max_saved_searches = 20
+    # Filtrele de nomenclator sunt NumberFilter pe *_id: un id inexistent trece de filterset,
+    # iar categoria și orașul sunt copiate în chei străine la salvare
+    related_params = {'category': Category, 'county': County, 'city': City, 'neighborhood': Neighborhood}
+
+    def get(self, request):
+        saved_searches = SavedSearch.objects.filter(user=request.user)
+        serializer = SavedSearchSerializer(saved_searches, many=True)
+        return Response(serializer.data)
+
+    def post(self, request):
+        if SavedSearch.objects.filter(user=request.user).count() >= self.max_saved_searches:
+            return Response(
+                {"detail": f"Poți salva cel mult {self.max_saved_searches} căutări."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        serializer = SavedSearchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # Păstrăm doar parametrii de filtrare cunoscuți, validați ca în lista de anunțuri
+        params = {
+            name: value for name, value in serializer.validated_data.get('params', {}).items()
+            if name in self.filterset_class.base_filters and name != 'ordering'
+        }
+        filterset = self.filterset_class(params)
+        if not filterset.is_valid():
+            return Response({'params': filterset.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        errors = {}
+        for name, model in self.related_params.items():
+            value = filterset.form.cleaned_data.get(name)
+            if value is not None and not model.objects.filter(pk=value).exists():
+                errors[name] = [f"Nu există înregistrarea cu id-ul {params[name]}."]
+        if errors:
+            return Response({'params': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer.save(user=request.user, params=params)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+class SavedSearchDetailAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def delete(self, request, pk):
+        deleted, _ = SavedSearch.objects.filter(pk=pk, user=request.user).delete()
+        if not deleted:
+            return Response({"detail": "Căutarea salvată nu a fost găsită."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 class PromoteListingView(APIView):
     permission_classes = [IsAuthenticated]
@@ -954,6 +1456,8 @@ class ToggleLikeAPIView(APIView):
 
         # Folosim metoda din model pentru gestionarea like-urilor
         liked = listing.toggle_like(request.user)
+        invalidate_tags(f'listing:{listing.pk}')
+        update_liked_listing_ids(request.user, listing.pk, liked)
 
         # Returnăm răspunsul JSON cu starea curentă
         return Response({'liked': liked, 'like_count': listing.like_count})
@@ -973,9 +1477,15 @@ class ToggleListingActivationView(APIView):
 class SimilarListingsAPIView(APIView):
     permission_classes = [AllowAny]
 
-
-    @method_decorator(cache_page(CACHE_TIMEOUT))
     def get(self, request, uuid, *args, **kwargs):
+        response = self.get_similar(request, uuid=uuid)
+        if response.status_code != 200:
+            return response
+        # Răspunsul din cache este comun; inima fiecărui card este adăugată per utilizator
+        return Response(annotate_liked(response.data, request.user), status=status.HTTP_200_OK)
+
+    @cache_response(CACHE_TIMEOUT, tags=['listing:{uuid}'])
+    def get_similar(self, request, uuid):
         try:
             # Verifică dacă anunțul există
             listing = Listing.objects.get(id=uuid)
@@ -999,16 +1509,20 @@ class SimilarListingsAPIView(APIView):
                 status=status.HTTP_403_FORBIDDEN,
             )
 
+        # Rezultatul depinde de toate anunțurile din aceeași categorie și localitate
+        self.cache_tags.add(category_city_tag(listing.category_id, listing.city_id))
+
         # Găsește anunțuri similare
-        similar_listings = get_similar_listings(uuid)
+        similar_listings = get_similar_listings(
+            uuid, queryset=card_queryset(Listing.objects.all())
+        )
 
         # Dacă nu sunt găsite anunțuri similare, returnăm un array gol
         if not similar_listings:
             return Response([], status=status.HTTP_200_OK)
 
         # Serializăm anunțurile similare
-        serializer = ListingMinimalSerializer(similar_listings, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serialize_listing_cards(similar_listings, ListingMinimalSerializer), status=status.HTTP_200_OK)
 
 class ReportCreateAPIView(APIView):
     permission_classes = [AllowAny]
@@ -1125,6 +1639,7 @@ class PrivacyPolicySectionAPIView(APIView):
     """API pentru a obține toate secțiunile politicii de confidențialitate"""
     permission_classes = [AllowAny]
 
+    @conditional_on_tables(PrivacyPolicySection)
     def get(self, request):
         sections = PrivacyPolicySection.objects.all().order_by('section_number')
         serializer = PrivacyPolicySectionSerializer(sections, many=True)
@@ -1135,6 +1650,7 @@ class PrivacyPolicyHistoryAPIView(APIView):
     """API pentru a obține istoricul modificărilor politicii"""
 
     permission_classes = [AllowAny]
+    @conditional_on_tables(PrivacyPolicySection, PrivacyPolicyHistory)
     def get(self, request):
         history = PrivacyPolicyHistory.objects.all().order_by('-modified_at')
         serializer = PrivacyPolicyHistorySerializer(history, many=True)
@@ -1144,6 +1660,7 @@ class TermsPolicySectionAPIView(APIView):
     """API pentru a obține toate secțiunile termeni si conditii."""
     permission_classes = [AllowAny]
 
+    @conditional_on_tables(TermsPolicySection)
     def get(self, request):
         sections = TermsPolicySection.objects.all().order_by('section_number')
         serializer = TermsPolicySectionSerializer(sections, many=True)
@@ -1154,9 +1671,20 @@ class TermsPolicyHistoryAPIView(APIView):
     """API pentru a obține istoricul modificărilor politicii"""
 
     permission_classes = [AllowAny]
+    @conditional_on_tables(TermsPolicySection, TermsPolicyHistory)
     def get(self, request):
         history = TermsPolicyHistory.objects.all().order_by('-modified_at')
         serializer = TermsPolicyHistorySerializer(history, many=True)
         return Response(serializer.data)
-            
-            
\ No newline at end of file
+
+
+class CacheStatsAPIView(APIView):
+    """Statisticile cache-ului per grup (prefix de cheie sau view); DELETE le resetează."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({'groups': get_stats()})
+
+    def delete(self, request):
+        reset_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -188,13 +188,37 @@ SIMPLE_JWT = {
     "UPDATE_LAST_LOGIN": True,                     # Se va actualiza câmpul `last_login` la fiecare utilizare a unui refresh token.
 }
 
+# 'default' ține cheile citite des în memoria procesului (LRU), în fața cache-ului partajat 'shared';
+# invalidarea între procesele gunicorn se face prin cache-ul partajat (vezi api/cache_backends.py).
+# 'shared' este FileBasedCache, deci comun doar proceselor de pe aceeași mașină: pe mai multe mașini
+# fiecare are cache-ul ei (pentru un cache comun, 'shared' trebuie mutat pe Redis/Memcached)
 CACHES = {
     'default': {
+        'BACKEND': 'api.cache_backends.TwoTierCache',
+        'TIMEOUT': 8 * 60 * 60,  # Timpul de expirare pentru cache (în secunde), 28800 seconds (8 hours) 
+        'OPTIONS': {
+            'SHARED_ALIAS': 'shared',
+            'LOCAL_MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 30,
+            # Contoarele DRF throttle, lock-urile de recalculare și cheile rescrise des (like-urile unui
+            # utilizator la fiecare toggle) se citesc mereu din cache-ul partajat
+            'BYPASS_PREFIXES': ('throttle_', 'cache_lock:', 'cache_stats:', 'liked_ids:'),
+            # Fragmentele de card au versiunea în cheie: ținute local, dar fără intrare în jurnal
+            'IMMUTABLE_PREFIXES': ('card:',),
+        },
+    },
+    'shared': {
         'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
         'LOCATION': BASE_DIR / 'cache',  # Using BASE_DIR to set the cache directory,
-        'TIMEOUT': 8 * 60 * 60,  # Timpul de expirare pentru cache (în secunde), 28800 seconds (8 hours) 
-    }
+        'TIMEOUT': 8 * 60 * 60,
+        'OPTIONS': {
+            # Limita reală este CACHE_DISK_BUDGET (LRU în delete_expired_cache); cull-ul aleator din
+            # FileBasedCache rămâne doar o plasă de siguranță
+            'MAX_ENTRIES': 200000,
+        },
+    },
 }
+CACHE_DISK_BUDGET = 2 * 1024 * 1024 * 1024  # Bytes; peste buget, delete_expired_cache evacuează intrările folosite cel mai de demult
 
 # for bleach allowed tags
 # Which HTML tags are allowed
@@ -233,6 +257,28 @@ LOGGING = {
 SITE_NAME = 'Imobiliare.Casa'  
 DEFAULT_FROM_EMAIL = "admin@imobiliare.casa"  # Adresa de email implicită pentru trimiterea emailurilor
 FRONTEND_URL = "https://imobiliare.casa"  # URL-ul frontend-ului
+API_URL = os.getenv('API_URL', 'http://127.0.0.1:8000')  # URL-ul public al API-ului, pentru link-uri absolute generate în afara unui request
+
+# for home feed materializer
+# Blob-ul este un fișier local, per host, iar lock-ul de reconstruire este fcntl.flock: HOME_FEED_PATH trebuie
+# să fie pe discul local (nu NFS), iar materialize_home_feed rulează din cron pe fiecare host care servește API-ul
+HOME_FEED_PATH = BASE_DIR / 'materialized' / 'home_feed.json'  # Răspunsul pre-serializat pentru /listings/home/
+HOME_FEED_MAX_AGE = 15 * 60  # Secunde după care feed-ul este reconstruit chiar dacă nu s-a modificat nimic
+
+# for listing view counter (comanda flush_view_counts)
+VIEW_COUNTS_LOG = BASE_DIR / 'counters' / 'listing_views.log'  # Vizualizările neînregistrate încă în baza de date
+VISITOR_IP_HEADER = os.getenv('VISITOR_IP_HEADER', 'REMOTE_ADDR')  # ex. HTTP_X_REAL_IP în spatele nginx, pentru vizitatorii unici
+VISITOR_SKETCH_RETENTION_DAYS = 180  # Cât păstrăm sketch-urile zilnice de vizitatori (unique_views nu depinde de ele)
+
+# for cache warm-up (comanda warm_cache)
+# {category} (și {county}, dacă apare) sunt înlocuite cu fiecare categorie principală (id) și fiecare județ (slug)
+CACHE_WARMUP_URLS = [
+    '/api/listings/home/',
+    '/api/listings/promoted/',
+    '/api/listings/facets/',
+    '/api/listings/facets/?category={category}',
+]
+CACHE_WARMUP_ACCESS_LOG = os.getenv('CACHE_WARMUP_ACCESS_LOG')  # Log nginx (format combined), folosit ca profil de acces
 
 # for promoting listings
 PROMOTION_PRICE_PER_DAY_EX_VAT = 1  # Preț per zi fără TVA